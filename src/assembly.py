@@ -0,0 +1,360 @@
+"""Genome assembly graphs as integer CSR arrays.
+
+Nodes are numbered 0..V-1. The distinct edges leaving node u are targets[offsets[u]:offsets[u+1]],
+with multiplicity[e] copies of edge e. De Bruijn graph nodes are (k-1)-mer codes (see kmers.py),
+kept sorted in `nodes`, so a node's number is the rank of its code.
+"""
+import sys
+from typing import Hashable, Iterable, Sequence
+
+import numpy as np
+import pytest
+
+from kmers import MAX_K, decode_kmers, kmer_codes, unique_codes
+from packed import PackedGenome, as_codes, decode
+import seqio
+
+class CSRGraph:
+  def __init__(self, offsets: np.ndarray, targets: np.ndarray, multiplicity: np.ndarray, nodes: 'np.ndarray|list|None' = None, node_len: int|None = None):
+    self.offsets = offsets
+    self.targets = targets
+    self.multiplicity = multiplicity
+    self.nodes = nodes #(k-1)-mer codes when node_len is set, otherwise any labels
+    self.node_len = node_len
+
+  @classmethod
+  def from_edges(cls, sources: np.ndarray, targets: np.ndarray, num_nodes: int, nodes=None, node_len: int|None = None) -> 'CSRGraph':
+    """Graph of the given edge list. Repeated edges are merged into one with a multiplicity,
+    and each node's edges are kept in order of first appearance."""
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    keys = sources * num_nodes + targets
+    uniq, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.lexsort((first, uniq // num_nodes))
+    uniq, counts = uniq[order], counts[order]
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(uniq // num_nodes, minlength=num_nodes), out=offsets[1:])
+    return cls(offsets, uniq % num_nodes, counts.astype(np.int64), nodes, node_len)
+
+  @classmethod
+  def from_dict(cls, graph: dict[Hashable, list[Hashable]]) -> 'CSRGraph':
+    """Graph of an adjacency dict (such as util.parse_graph gives), nodes labelled by the dict's keys and values"""
+    index = {}
+    for node, edges in graph.items():
+      index.setdefault(node, len(index))
+      for target in edges:
+        index.setdefault(target, len(index))
+    sources = [index[node] for node, edges in graph.items() for _ in edges]
+    targets = [index[target] for edges in graph.values() for target in edges]
+    return cls.from_edges(np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64), len(index), list(index))
+
+  @property
+  def num_nodes(self) -> int:
+    return len(self.offsets) - 1
+
+  @property
+  def num_edges(self) -> int:
+    return int(self.multiplicity.sum())
+
+  def sources(self) -> np.ndarray:
+    """The source node of each distinct edge"""
+    return np.repeat(np.arange(self.num_nodes), np.diff(self.offsets))
+
+  def out_degrees(self) -> np.ndarray:
+    return np.bincount(self.sources(), weights=self.multiplicity, minlength=self.num_nodes).astype(np.int64)
+
+  def in_degrees(self) -> np.ndarray:
+    return np.bincount(self.targets, weights=self.multiplicity, minlength=self.num_nodes).astype(np.int64)
+
+  def labels(self) -> list:
+    if self.nodes is None:
+      return list(range(self.num_nodes))
+    if self.node_len is not None:
+      return decode_kmers(self.nodes, self.node_len)
+    return list(self.nodes)
+
+  def to_dict(self) -> dict:
+    """Adjacency dict of the nodes with outgoing edges, each edge repeated by its multiplicity"""
+    labels = self.labels()
+    offsets, targets, multiplicity = self.offsets.tolist(), self.targets.tolist(), self.multiplicity.tolist()
+    graph = {}
+    for u in range(self.num_nodes):
+      if offsets[u] < offsets[u+1]:
+        graph[labels[u]] = [labels[targets[e]] for e in range(offsets[u], offsets[u+1]) for _ in range(multiplicity[e])]
+    return graph
+
+  @property
+  def nbytes(self) -> int:
+    size = self.offsets.nbytes + self.targets.nbytes + self.multiplicity.nbytes
+    return size + (self.nodes.nbytes if isinstance(self.nodes, np.ndarray) else 0)
+
+def encode_kmers(kmers: Sequence[str], k: int) -> np.ndarray:
+  """Codes of equal-length k-mer strings, encoded together"""
+  if k > MAX_K:
+    raise ValueError(f"k must be at most {MAX_K} for uint64 codes, got {k}")
+  if len(kmers) == 0:
+    return np.zeros(0, dtype=np.uint64)
+  codes = as_codes(''.join(kmers)).reshape(len(kmers), k)
+  kcodes = np.zeros(len(kmers), dtype=np.uint64)
+  for j in range(k):
+    kcodes <<= np.uint64(2)
+    kcodes |= codes[:, j]
+  return kcodes
+
+def de_bruijn_from_kmer_codes(kcodes: np.ndarray, k: int) -> CSRGraph:
+  """De Bruijn graph with one edge per k-mer code, from its (k-1)-prefix to its (k-1)-suffix"""
+  kcodes = np.asarray(kcodes, dtype=np.uint64)
+  prefixes = kcodes >> np.uint64(2)
+  suffixes = kcodes & np.uint64(4**(k-1) - 1)
+  nodes = unique_codes(np.concatenate([prefixes, suffixes]))
+  return CSRGraph.from_edges(np.searchsorted(nodes, prefixes), np.searchsorted(nodes, suffixes), len(nodes), nodes, k-1)
+
+def de_bruijn_from_string(text: 'str|PackedGenome|np.ndarray', k: int) -> CSRGraph:
+  return de_bruijn_from_kmer_codes(kmer_codes(text, k), k)
+
+def de_bruijn_from_kmers(kmers: Sequence[str], k: int|None = None) -> CSRGraph:
+  return de_bruijn_from_kmer_codes(encode_kmers(kmers, k or len(kmers[0])), k or len(kmers[0]))
+
+def de_bruijn_from_batches(source: 'str|Iterable[seqio.SequenceBatch]', k: int) -> CSRGraph:
+  """De Bruijn graph of the k-mers of every fragment of a sequence file (or its batches), without k-mer strings"""
+  kcodes = list(seqio.composition(source, k))
+  return de_bruijn_from_kmer_codes(np.concatenate(kcodes) if kcodes else np.zeros(0, dtype=np.uint64), k)
+
+def overlap_graph(reads: Sequence[str]) -> CSRGraph:
+  """Overlap graph of equal-length reads: an edge from each read to every read whose (k-1)-prefix is its (k-1)-suffix.
+  Nodes are the distinct reads in order of first appearance (labelled by the reads), so repeated reads are one node.
+  Reads of up to MAX_K bases are indexed by prefix code with one stable sort, and each suffix is looked up with
+  a binary search. Longer reads are indexed in a dict keyed by their (k-1)-prefix, which is O(n) at any length."""
+  distinct = list(dict.fromkeys(reads))
+  k = len(distinct[0]) if distinct else 0
+  if k <= MAX_K:
+    codes = encode_kmers(distinct, k)
+    prefixes, suffixes = codes >> np.uint64(2), codes & np.uint64(4**(k-1) - 1)
+    sources, targets = _join(suffixes, prefixes)
+    return CSRGraph.from_edges(sources, targets, len(distinct), distinct)
+  index = {}
+  for i, read in enumerate(distinct):
+    index.setdefault(read[:-1], []).append(i)
+  matches = [(i, j) for i, read in enumerate(distinct) for j in index.get(read[1:], ())]
+  sources, targets = np.array(matches, dtype=np.int64).reshape(-1, 2).T
+  return CSRGraph.from_edges(sources, targets, len(distinct), distinct)
+
+def _join(ends: np.ndarray, starts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+  """All pairs (i, j) with ends[i] == starts[j], ordered by i then j.
+  starts is indexed with one stable sort and each end is looked up with a binary search."""
+  order = np.argsort(starts, kind='stable')
+  sorted_starts = starts[order]
+  lo = np.searchsorted(sorted_starts, ends, side='left')
+  counts = np.searchsorted(sorted_starts, ends, side='right') - lo
+  #positions lo[i], lo[i]+1, ..., hi[i]-1 of the sorted index for each i
+  return np.repeat(np.arange(len(ends)), counts), order[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+
+def _hierholzer(graph: CSRGraph, start: int) -> np.ndarray:
+  """Hierholzer's walk from start with an explicit stack, using each edge once per multiplicity.
+  Each node's cursor walks its edges from the last to the first (the order the dict version popped them in)."""
+  offsets, targets = graph.offsets.tolist(), graph.targets.tolist()
+  remaining = graph.multiplicity.tolist()
+  cursor = [offsets[u+1] - 1 for u in range(graph.num_nodes)]
+  stack, walk = [start], []
+  while stack:
+    u = stack[-1]
+    e = cursor[u]
+    if e >= offsets[u]:
+      remaining[e] -= 1
+      if remaining[e] == 0:
+        cursor[u] = e - 1
+      stack.append(targets[e])
+    else:
+      walk.append(stack.pop())
+  walk.reverse()
+  if len(walk) != graph.num_edges + 1:
+    raise ValueError("the graph's edges are not connected, so no walk uses them all")
+  return np.array(walk, dtype=np.int64)
+
+def path_endpoints(graph: CSRGraph) -> tuple[int, int]:
+  """Start and end nodes of an Eulerian path from the degree arrays (equal for a balanced graph)"""
+  balance = graph.out_degrees() - graph.in_degrees()
+  starts, ends = np.flatnonzero(balance == 1), np.flatnonzero(balance == -1)
+  if (np.abs(balance) > 1).any() or len(starts) != len(ends) or len(starts) > 1:
+    raise ValueError("the graph has no Eulerian path: too many unbalanced nodes")
+  if len(starts):
+    return int(starts[0]), int(ends[0])
+  start = int(np.argmax(np.diff(graph.offsets) > 0))
+  return start, start
+
+def eulerian_cycle(graph: CSRGraph, start: int|None = None) -> np.ndarray:
+  """Node ids of an Eulerian cycle from start (the first node with edges by default), start included at both ends"""
+  if (graph.out_degrees() != graph.in_degrees()).any():
+    raise ValueError("the graph has no Eulerian cycle: in and out degrees differ")
+  if start is None:
+    start = path_endpoints(graph)[0]
+  return _hierholzer(graph, start)
+
+def eulerian_path(graph: CSRGraph) -> np.ndarray:
+  return _hierholzer(graph, path_endpoints(graph)[0])
+
+def unitigs(graph: CSRGraph) -> tuple[np.ndarray, np.ndarray]:
+  """Maximal non-branching paths, CSR-style: path i is nodes[offsets[i]:offsets[i+1]].
+  Every path runs from a node that is not 1-in-1-out through 1-in-1-out nodes to the next node that is not
+  (one path per copy of a repeated edge); the remaining 1-in-1-out nodes form isolated cycles, which start
+  and end at their smallest node. Each node and edge is visited once, so this is linear in the graph size."""
+  simple = ((graph.in_degrees() == 1) & (graph.out_degrees() == 1)).tolist()
+  offsets, targets, multiplicity = graph.offsets.tolist(), graph.targets.tolist(), graph.multiplicity.tolist()
+  path_offsets, path_nodes = [0], []
+  for v in range(graph.num_nodes):
+    if simple[v]:
+      continue
+    for e in range(offsets[v], offsets[v+1]):
+      for _ in range(multiplicity[e]):
+        path_nodes.append(v)
+        w = targets[e]
+        while simple[w]:
+          path_nodes.append(w)
+          w = targets[offsets[w]]
+        path_nodes.append(w)
+        path_offsets.append(len(path_nodes))
+  seen = np.zeros(graph.num_nodes, dtype=bool)
+  seen[path_nodes] = True
+  seen = seen.tolist()
+  for v in range(graph.num_nodes):
+    if simple[v] and not seen[v]:
+      path_nodes.append(v)
+      w = targets[offsets[v]]
+      while w != v:
+        seen[w] = True
+        path_nodes.append(w)
+        w = targets[offsets[w]]
+      path_nodes.append(v)
+      path_offsets.append(len(path_nodes))
+  return np.array(path_offsets, dtype=np.int64), np.array(path_nodes, dtype=np.int64)
+
+def spell_unitigs(graph: CSRGraph, offsets: np.ndarray, nodes: np.ndarray) -> list[str]:
+  """Contig strings of De Bruijn graph paths: each path's first (k-1)-mer followed by the last base of every other node"""
+  if graph.node_len is None:
+    raise ValueError("only De Bruijn graphs (with (k-1)-mer code nodes) spell contigs")
+  codes = np.asarray(graph.nodes, dtype=np.uint64)[nodes]
+  firsts = decode_kmers(codes[offsets[:-1]], graph.node_len)
+  last_bases = decode((codes & np.uint64(3)).astype(np.uint8))
+  return [first + last_bases[lo+1:hi] for first, lo, hi in zip(firsts, offsets[:-1].tolist(), offsets[1:].tolist())]
+
+def compact(graph: CSRGraph) -> CSRGraph:
+  """The unitig graph: node i is unitig i, with an edge to every unitig starting where it ends.
+  Nodes are labelled by their contig strings in a De Bruijn graph, otherwise by tuples of the path's labels."""
+  offsets, nodes = unitigs(graph)
+  firsts, lasts = nodes[offsets[:-1]], nodes[offsets[1:] - 1]
+  sources, targets = _join(lasts, firsts)
+  if graph.node_len is not None:
+    labels = spell_unitigs(graph, offsets, nodes)
+  else:
+    node_labels = graph.labels()
+    labels = [tuple(node_labels[u] for u in nodes[lo:hi].tolist()) for lo, hi in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+  return CSRGraph.from_edges(sources, targets, len(labels), labels)
+
+## TESTS
+def test_de_bruijn_from_string():
+  graph = de_bruijn_from_string('AAGATTCTCTAAGA', 4)
+  assert graph.num_nodes == 9 and graph.num_edges == 11
+  assert graph.to_dict() == {'AAG': ['AGA', 'AGA'], 'AGA': ['GAT'], 'GAT': ['ATT'], 'ATT': ['TTC'], 'TTC': ['TCT'],
+                             'TCT': ['CTC', 'CTA'], 'CTC': ['TCT'], 'CTA': ['TAA'], 'TAA': ['AAG']}
+  aag = graph.labels().index('AAG')
+  assert graph.multiplicity[graph.offsets[aag]] == 2
+  assert graph.out_degrees().sum() == graph.in_degrees().sum() == 11
+
+def test_de_bruijn_from_kmers():
+  graph = de_bruijn_from_kmers(['GAGG', 'CAGG', 'GGGG', 'GGGA', 'CAGG', 'AGGG', 'GGAG'])
+  assert graph.to_dict() == {'GAG': ['AGG'], 'CAG': ['AGG', 'AGG'], 'GGG': ['GGG', 'GGA'], 'AGG': ['GGG'], 'GGA': ['GAG']}
+  assert (graph.nodes[:-1] < graph.nodes[1:]).all()
+
+def test_de_bruijn_from_batches(tmp_path):
+  path = tmp_path / 'reads.fa'
+  path.write_text('>r1\nAAGATTCT\n>r2\nCTCTAAGA\n>r3\nNNAG\n')
+  graph = de_bruijn_from_batches(str(path), 4)
+  expected = de_bruijn_from_kmers([s[i:i+4] for s in ['AAGATTCT', 'CTCTAAGA'] for i in range(5)])
+  assert graph.to_dict() == expected.to_dict()
+  assert de_bruijn_from_batches([seqio.SequenceBatch.from_strings(['AAGATTCT', 'CTCTAAGA'])], 4).to_dict() == expected.to_dict()
+
+def test_encode_kmers():
+  assert encode_kmers(['ACGT', 'TTTT'], 4).tolist() == [0b00011011, 0b11111111]
+  with pytest.raises(ValueError): #codes of 33-mers would overflow uint64
+    de_bruijn_from_kmers(['A' * 33, 'C' + 'A' * 32])
+
+def test_csr_from_dict():
+  graph = {0: [3], 1: [0], 2: [1, 6], 3: [2], 4: [2], 5: [4], 6: [5, 8], 7: [9], 8: [7], 9: [6]}
+  csr = CSRGraph.from_dict(graph)
+  assert csr.to_dict() == graph
+  assert dict(zip(csr.labels(), csr.in_degrees().tolist())) == {0: 1, 1: 1, 2: 2, 3: 1, 4: 1, 5: 1, 6: 2, 7: 1, 8: 1, 9: 1}
+
+def test_overlap_graph():
+  reads = ['ATGCG', 'GCATG', 'CATGC', 'AGGCA', 'GGCAT', 'GGCAC']
+  assert overlap_graph(reads).to_dict() == {'GCATG': ['CATGC'], 'CATGC': ['ATGCG'], 'AGGCA': ['GGCAT', 'GGCAC'], 'GGCAT': ['GCATG']}
+  #repeated reads are one node, and a read can overlap itself
+  graph = overlap_graph(['AAAA', 'CAAA', 'AAAA', 'AAAC'])
+  assert graph.to_dict() == {'AAAA': ['AAAA', 'AAAC'], 'CAAA': ['AAAA', 'AAAC']}
+  assert graph.num_nodes == 3
+  #reads longer than MAX_K are indexed by prefix string
+  genome = 'ACGGTCATTGCAGTTACCGATGCATTAGCCGATACCAGTTTGACCA'
+  reads = [genome[i:i+40] for i in range(len(genome) - 39)]
+  assert overlap_graph(reads + reads[:2]).to_dict() == {reads[i]: [reads[i+1]] for i in range(len(reads) - 1)}
+
+def is_eulerian_walk(graph: CSRGraph, walk: np.ndarray) -> bool:
+  edges = {}
+  for u, v, m in zip(graph.sources().tolist(), graph.targets.tolist(), graph.multiplicity.tolist()):
+    edges[(u, v)] = m
+  for u, v in zip(walk[:-1].tolist(), walk[1:].tolist()):
+    edges[(u, v)] = edges.get((u, v), 0) - 1
+  return all(m == 0 for m in edges.values())
+
+def test_eulerian_cycle():
+  graph = CSRGraph.from_dict({0: [3], 1: [0], 2: [1, 6], 3: [2], 4: [2], 5: [4], 6: [5, 8], 7: [9], 8: [7], 9: [6]})
+  cycle = eulerian_cycle(graph)
+  assert cycle[0] == cycle[-1] and is_eulerian_walk(graph, cycle)
+  assert [graph.labels()[u] for u in cycle] == [0, 3, 2, 6, 8, 7, 9, 6, 5, 4, 2, 1, 0]
+  with pytest.raises(ValueError):
+    eulerian_cycle(CSRGraph.from_dict({0: [1], 1: [2], 2: []}))
+  with pytest.raises(ValueError): #two disconnected cycles
+    eulerian_cycle(CSRGraph.from_dict({0: [1], 1: [0], 2: [3], 3: [2]}))
+
+def test_eulerian_path():
+  graph = de_bruijn_from_kmers(['GAGG', 'CAGG', 'GGGG', 'GGGA', 'CAGG', 'AGGG', 'GGAG'])
+  with pytest.raises(ValueError): #CAG has out degree 2 and in degree 0
+    eulerian_path(graph)
+  graph = de_bruijn_from_string('TAATGCCATGGGATGTT', 3)
+  path = eulerian_path(graph)
+  assert is_eulerian_walk(graph, path) and graph.labels()[path[0]] == 'TA' and graph.labels()[path[-1]] == 'TT'
+  #long paths do not recurse
+  rng = np.random.default_rng(0)
+  text = rng.integers(0, 4, 200_000).astype(np.uint8)
+  graph = de_bruijn_from_string(text, 20)
+  path = eulerian_path(graph)
+  assert len(path) == graph.num_edges + 1
+
+def test_unitigs():
+  graph = CSRGraph.from_dict({1: [2], 2: [3], 3: [4, 5], 6: [7], 7: [6]})
+  offsets, nodes = unitigs(graph)
+  labels = graph.labels()
+  paths = [[labels[u] for u in nodes[lo:hi]] for lo, hi in zip(offsets[:-1], offsets[1:])]
+  assert paths == [[1, 2, 3], [3, 4], [3, 5], [6, 7, 6]]
+  assert compact(graph).to_dict() == {(1, 2, 3): [(3, 4), (3, 5)], (6, 7, 6): [(6, 7, 6)]}
+  #repeated edges are one path per copy
+  graph = de_bruijn_from_kmers(['ATG', 'ATG', 'TGT', 'TGG', 'CAT', 'GGA', 'GAT', 'AGA'])
+  compacted = compact(graph)
+  assert sorted(compacted.labels()) == ['AGA', 'ATG', 'ATG', 'CAT', 'GAT', 'TGGA', 'TGT']
+  assert compacted.num_edges == 10 #ATG x2 -> TGGA, TGT; CAT, GAT -> ATG x2; AGA, TGGA -> GAT
+
+def test_unitigs_of_genome():
+  #a random genome has almost only 1-in-1-out nodes, and its unitigs cover every k-mer once
+  rng = np.random.default_rng(1)
+  text = decode(rng.integers(0, 4, 50_000).astype(np.uint8))
+  graph = de_bruijn_from_string(text, 12)
+  compacted = compact(graph)
+  assert compacted.num_nodes < graph.num_nodes // 10
+  contigs = compacted.labels()
+  assert all(contig in text for contig in contigs)
+  assert sum(len(contig) - 11 for contig in contigs) == graph.num_edges
+  #a circular genome with no repeats is one cycle
+  genome = 'ACGGTCATTGCA'
+  (contig,) = compact(de_bruijn_from_string(genome + genome[:10], 11)).labels()
+  assert len(contig) == len(genome) + 10 and contig in genome * 3
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
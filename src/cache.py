@@ -0,0 +1,222 @@
+"""Content-addressed cache for the results of long-running searches.
+
+A result is stored under the hash of (algorithm, parameters, dataset content hash, seed, code version),
+so changing any of them misses the cache instead of returning a stale result. Entries are JSON files
+written atomically (a temp file renamed into place), so concurrent readers see either nothing or a
+whole entry, and the least recently used entries are evicted once the cache grows past its size limit.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+import tempfile
+import types
+from typing import Callable, Iterable
+
+import numpy as np
+import pytest
+
+import constants
+
+MAX_CACHE_BYTES = 256 << 20
+ENTRY_SUFFIX = '.json'
+
+def content_hash(data) -> str:
+  """sha256 of a dataset: a string, an array, or a (nested) list of them"""
+  h = hashlib.sha256()
+  def feed(x):
+    if isinstance(x, str):
+      h.update(b's' + x.encode())
+    elif isinstance(x, np.ndarray):
+      h.update(b'a' + str(x.dtype).encode() + str(x.shape).encode() + np.ascontiguousarray(x).tobytes())
+    elif isinstance(x, (list, tuple)):
+      h.update(b'l%d' % len(x))
+      for item in x:
+        feed(item)
+    else:
+      h.update(b'j' + json.dumps(x, sort_keys=True).encode())
+  feed(data)
+  return h.hexdigest()
+
+def code_version(modules: Iterable[types.ModuleType]) -> str:
+  """sha256 over the source files of modules, so editing them invalidates their cached results"""
+  h = hashlib.sha256()
+  for module in sorted(set(modules), key=lambda m: m.__name__):
+    with open(inspect.getfile(module), 'rb') as f:
+      h.update(module.__name__.encode() + b'\0' + f.read())
+  return h.hexdigest()
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def project_modules(modules: Iterable[types.ModuleType]) -> list[types.ModuleType]:
+  """modules and every project module they import, transitively: modules imported as names and the
+  modules of imported functions and classes, as long as their source lives under PROJECT_ROOT"""
+  def in_project(module):
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.abspath(path).startswith(PROJECT_ROOT + os.sep) and 'site-packages' not in path
+  seen = {}
+  stack = [m for m in modules if in_project(m)]
+  while stack:
+    module = stack.pop()
+    if module.__name__ in seen:
+      continue
+    seen[module.__name__] = module
+    for value in list(vars(module).values()):
+      dep = value if isinstance(value, types.ModuleType) else sys.modules.get(getattr(value, '__module__', None) or '')
+      if dep is not None and dep.__name__ not in seen and in_project(dep):
+        stack.append(dep)
+  return list(seen.values())
+
+def cache_key(algorithm: str, params: dict, dataset: str, seed, code: str) -> str:
+  record = {'algorithm': algorithm, 'params': params, 'dataset': dataset, 'seed': seed, 'code': code}
+  return hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+class ResultCache:
+  def __init__(self, path: str = constants.CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES):
+    self.path = path
+    self.max_bytes = max_bytes
+    os.makedirs(path, exist_ok=True)
+
+  def _entry(self, key: str) -> str:
+    return os.path.join(self.path, key + ENTRY_SUFFIX)
+
+  def get(self, key: str) -> tuple[bool, object]:
+    """(True, result) on a hit, (False, None) on a miss. A hit refreshes the entry's eviction order."""
+    path = self._entry(key)
+    try:
+      with open(path) as f:
+        entry = json.load(f)
+      os.utime(path)
+    except (FileNotFoundError, json.JSONDecodeError):
+      return False, None
+    result = entry['result']
+    return True, tuple(result) if entry.get('tuple') else result
+
+  def put(self, key: str, result, meta: dict|None = None) -> None:
+    entry = {'key': key, 'meta': meta or {}, 'result': result, 'tuple': isinstance(result, tuple)}
+    fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'w') as f:
+        json.dump(entry, f)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(tmp, self._entry(key))
+    except BaseException:
+      os.unlink(tmp)
+      raise
+    self.evict()
+
+  def entries(self) -> list[tuple[float, int, str]]:
+    """(last used, size, path) of every entry, least recently used first"""
+    entries = []
+    for name in os.listdir(self.path):
+      if not name.endswith(ENTRY_SUFFIX):
+        continue
+      path = os.path.join(self.path, name)
+      try:
+        stat = os.stat(path)
+      except FileNotFoundError: #evicted by another process
+        continue
+      entries.append((stat.st_mtime, stat.st_size, path))
+    return sorted(entries)
+
+  def size(self) -> int:
+    return sum(size for _, size, _ in self.entries())
+
+  def evict(self) -> None:
+    """Delete least recently used entries until the cache fits in max_bytes"""
+    entries = self.entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+      if total <= self.max_bytes:
+        break
+      try:
+        os.unlink(path)
+      except FileNotFoundError:
+        pass
+      total -= size
+
+def cached(algorithm: str, cache: ResultCache|None = None, data: Iterable[str] = ('texts',), code: Iterable[types.ModuleType] = ()) -> Callable:
+  """Decorator caching a search's results in cache (a ResultCache at constants.CACHE_PATH by default).
+  The arguments named in data are keyed by content hash, 'seed' (if the function takes one) is keyed as is,
+  and the rest are keyed as parameters. The code version covers the function's module, the modules in code,
+  and every project module they import (see project_modules), so editing an engine the search calls recomputes.
+  Results must be JSON serializable; tuples come back as tuples. The original function is available as .uncached."""
+  data = tuple(data)
+  def decorator(func):
+    signature = inspect.signature(func)
+    version = code_version(project_modules([sys.modules[func.__module__], *code]))
+    store = cache
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      nonlocal store
+      if store is None:
+        store = ResultCache()
+      bound = signature.bind(*args, **kwargs)
+      bound.apply_defaults()
+      params = dict(bound.arguments)
+      dataset = content_hash([params.pop(name) for name in data])
+      seed = params.pop('seed', None)
+      key = cache_key(algorithm, params, dataset, seed, version)
+      hit, result = store.get(key)
+      if hit:
+        logging.info(f"{algorithm}: cache hit {key[:12]}")
+        return result
+      result = func(*args, **kwargs)
+      store.put(key, result, {'algorithm': algorithm, 'params': params, 'dataset': dataset, 'seed': seed})
+      return result
+    wrapper.uncached = func
+    return wrapper
+  return decorator
+
+## TESTS
+def test_content_hash():
+  assert content_hash(['ACGT', 'GG']) == content_hash(['ACGT', 'GG'])
+  assert content_hash(['ACGT', 'GG']) != content_hash(['ACG', 'TGG'])
+  assert content_hash(np.arange(3)) != content_hash(np.arange(3, dtype=np.uint8))
+
+def test_result_cache(tmp_path):
+  store = ResultCache(str(tmp_path), max_bytes=1050)
+  assert store.get('a') == (False, None)
+  store.put('a', (['ACGT'], 3))
+  assert store.get('a') == (True, (['ACGT'], 3))
+  store.put('b', ['x' * 450])
+  os.utime(store._entry('a'), (0, 0)) #a is the least recently used
+  store.put('c', ['y' * 450])
+  assert store.get('a') == (False, None)
+  assert store.get('b')[0] and store.get('c')[0]
+  assert store.size() <= 1050
+  assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_cached(tmp_path):
+  store = ResultCache(str(tmp_path))
+  calls = []
+  def search(texts, k, iters=10, seed=None):
+    calls.append((k, iters, seed))
+    return (['A' * k], len(texts))
+  cached_search = cached('search', store)(search)
+  texts = ['ACGTACGT', 'TTTTACGT']
+  assert cached_search(texts, 3) == (['AAA'], 2)
+  assert cached_search(texts, k=3, iters=10) == (['AAA'], 2)
+  assert len(calls) == 1
+  #any change of parameters, data or seed recomputes
+  cached_search(texts, 3, iters=20)
+  cached_search(texts + ['A'], 3)
+  cached_search(texts, 3, seed=1)
+  assert len(calls) == 4
+  assert cached_search.uncached is search
+
+def test_project_modules():
+  import lib, motifs
+  names = {m.__name__ for m in project_modules([lib])}
+  #median_string_codes runs kmers and neighbors code, and every search encodes through packed
+  assert {'lib', 'motifs', 'kmers', 'neighbors', 'packed', 'parallel', 'constants'} <= names
+  assert {'numpy', 'pandas', 'pytest'}.isdisjoint(names)
+  assert {m.__name__ for m in project_modules([motifs])} >= {'motifs', 'kmers', 'neighbors', 'packed'}
+  assert code_version(project_modules([motifs])) != code_version([motifs])
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
@@ -2,6 +2,7 @@ from enum import Enum
 import os
 
 TEMP_PATH = os.path.abspath('../outputs/temp.txt')
+CACHE_PATH = os.path.abspath('../outputs/cache')
 
 # These are imported from the weekX.py files, which are run at path src/, but also from the server 
 DATASETS = {
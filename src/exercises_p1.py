@@ -3,6 +3,8 @@ from lib import *
 from util import *
 import logging
 import constants
+from matching import MultiPatternMatcher
+import skew
 import os
 
 if __name__ == '__main__':
@@ -46,11 +48,12 @@ def test_part1():
   #1.3-6
   print_sep("""Return a space-separated list of starting positions (in increasing order) where CTTGATCAT appears as a substring in the Vibrio cholerae genome""")
   with open(constants.DATASETS['cholera']) as f: vibrio_cholera_genome = f.read()
-  ans = pattern_match(vibrio_cholera_genome, 'CTTGATCAT')
+  matches = MultiPatternMatcher(['CTTGATCAT', reverse_complement('CTTGATCAT')]).find_all(vibrio_cholera_genome)
+  ans = matches['CTTGATCAT']
   print(' '.join([str(x) for x in ans]))
   assert(ans == [60039,98409,129189,152283,152354,152411,163207,197028,200160,357976,376771,392723,532935,600085,622755,1065555])
   print_sep("""Positions for the reverse complement:""")
-  ans = pattern_match(vibrio_cholera_genome, reverse_complement('CTTGATCAT'))
+  ans = matches[reverse_complement('CTTGATCAT')]
   print(' '.join([str(x) for x in ans]))
 
   #1.4-5
@@ -70,7 +73,7 @@ def test_part1():
 
   #1.7-8
   print_sep("""Give all the values of Skew_i(GAGCCACCGCGATA) for i ranging from 0 to 14 as a collection of space-separated integers""")
-  skews = [str(s) for s in gc_skew_iter("GAGCCACCGCGATA")]
+  skews = [str(s) for s in skew.skew_array("GAGCCACCGCGATA")]
   ans = ' '.join(skews)
   print(ans)
   
@@ -138,7 +141,7 @@ def test_part1():
   print_sep("Epilogue: Find a DnaA Box in Salmonella enterica!!")
   print("The skew diagram shows the minimum at around position 3,923,600")
   salmonella: str = constants.dataset('salmonella')
-  ori_cands = minimum_skew(salmonella)
+  ori_cands = skew.min_skew_positions(salmonella)
   print(f"Minimum skew positions computed: {ori_cands}")
   ori_cand = ori_cands[0]
 
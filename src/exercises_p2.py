@@ -19,7 +19,7 @@ def test_part2():
     sorted(motif_enumerate_bruteforce(['ATTTGGC','TGCCTTA','CGGTATC', 'GAAAATT'],k=3,d=1)) ==
     ['ATA','ATT','GTT','TTT']
   )
-  run_test('../debug_datasets/MotifEnumeration', motif_enumerate_bruteforce, lambda inp: (inp[1],inp[0][0],inp[0][1]), exp_out_transform=lambda s: [] if s==["nan"] else s)
+  run_test('../debug_datasets/MotifEnumeration', motif_enumerate, lambda inp: (inp[1],inp[0][0],inp[0][1]), exp_out_transform=lambda s: [] if s==["nan"] else s)
 
   print_sep("Motif Matrix Entropy")
   motifs="""TCGGGGGTTTTT
@@ -0,0 +1,224 @@
+"""Suffix array + FM-index over a genome, built once and saved next to the dataset.
+
+The index covers text$ where $ sorts before every base. Row r of the index is the r-th
+smallest suffix: sa[r] is where it starts and bwt[r] is the base just before it (4 for $).
+"""
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import constants
+from packed import PackedGenome, as_codes, encode
+
+OCC_SAMPLE = 64 #rows between occurrence checkpoints
+INDEX_SUFFIX = '.fmidx.npz'
+_SENTINEL = 4
+_SEED_LEN = 27 #5^27 < 2^64, so 27 chars (bases + end marker) fit in one uint64 sort key
+
+def suffix_array(codes: np.ndarray) -> np.ndarray:
+  """Suffix array of codes by prefix doubling, starting from 27-character radix keys.
+  Suffixes that run off the end are padded with a symbol smaller than every base."""
+  n = len(codes)
+  padded = np.zeros(n + _SEED_LEN, dtype=np.uint64)
+  padded[:n] = codes.astype(np.uint64) + np.uint64(1)
+  keys = np.zeros(n, dtype=np.uint64)
+  for j in range(_SEED_LEN):
+    keys = keys * np.uint64(5) + padded[j:j+n]
+  _, rank = np.unique(keys, return_inverse=True)
+  rank = rank.ravel().astype(np.int64)
+  h = _SEED_LEN
+  while n and rank.max() < n - 1:
+    second = np.full(n, -1, dtype=np.int64)
+    second[:n-h] = rank[h:]
+    sa = np.lexsort((second, rank))
+    r1, r2 = rank[sa], second[sa]
+    new_group = np.ones(n, dtype=np.int64)
+    new_group[1:] = (r1[1:] != r1[:-1]) | (r2[1:] != r2[:-1])
+    rank[sa] = np.cumsum(new_group) - 1
+    h *= 2
+  return np.argsort(rank, kind='stable')
+
+class FMIndex:
+  """Exact and approximate pattern queries answered from a suffix array and FM-index.
+  count() is O(m) via backward search, positions() is O(m + occ)."""
+  def __init__(self, sa: np.ndarray, bwt: np.ndarray, occ: np.ndarray, C: np.ndarray, stats: dict|None = None):
+    self.sa = sa
+    self.bwt = bwt
+    self.occ = occ
+    self.C = C
+    self.stats = stats or {}
+    #plain python views make the per-character steps of backward search cheap
+    self._bwt_bytes = bwt.tobytes()
+    self._occ_rows = occ.tolist()
+    self._C = C.tolist()
+
+  @classmethod
+  def build(cls, text: 'str|PackedGenome|np.ndarray') -> 'FMIndex':
+    start = time.perf_counter()
+    codes = as_codes(text)
+    n = len(codes)
+    dtype = np.int32 if n < np.iinfo(np.int32).max else np.int64
+    sa = np.empty(n + 1, dtype=dtype)
+    sa[0] = n #the suffix '$'
+    sa[1:] = suffix_array(codes)
+    bwt = np.full(n + 1, _SENTINEL, dtype=np.uint8)
+    has_prev = sa > 0
+    bwt[has_prev] = codes[sa[has_prev] - 1]
+    blocks = -(-(n + 1) // OCC_SAMPLE)
+    is_base = bwt < _SENTINEL
+    block_counts = np.bincount(
+      (np.arange(n + 1) // OCC_SAMPLE)[is_base] * 4 + bwt[is_base], minlength=blocks * 4
+    ).reshape(blocks, 4)
+    occ = np.zeros((blocks + 1, 4), dtype=dtype)
+    np.cumsum(block_counts, axis=0, out=occ[1:])
+    C = np.zeros(4, dtype=np.int64)
+    C[:] = 1 + np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=4))[:-1]))
+    stats = {'length': n, 'build_seconds': time.perf_counter() - start}
+    return cls(sa, bwt, occ, C, stats)
+
+  @property
+  def length(self) -> int:
+    return len(self.sa) - 1
+
+  def save(self, path: str) -> None:
+    np.savez(path, sa=self.sa, bwt=self.bwt, occ=self.occ, C=self.C, build_seconds=self.stats.get('build_seconds', np.nan))
+    self.stats['disk_bytes'] = os.path.getsize(path)
+
+  @classmethod
+  def load(cls, path: str) -> 'FMIndex':
+    with np.load(path) as data:
+      index = cls(data['sa'], data['bwt'], data['occ'], data['C'])
+      build_seconds = float(data['build_seconds']) if 'build_seconds' in data else np.nan
+    index.stats = {'length': index.length, 'build_seconds': build_seconds, 'disk_bytes': os.path.getsize(path)}
+    return index
+
+  def _occ(self, c: int, i: int) -> int:
+    """Occurrences of base c in bwt[0:i]"""
+    block = i // OCC_SAMPLE
+    return self._occ_rows[block][c] + self._bwt_bytes.count(c, block * OCC_SAMPLE, i)
+
+  def _lf(self, c: int, lo: int, hi: int) -> tuple[int, int]:
+    return self._C[c] + self._occ(c, lo), self._C[c] + self._occ(c, hi)
+
+  def interval(self, pattern: 'str|np.ndarray') -> tuple[int, int]:
+    """The range of index rows whose suffixes start with pattern (backward search)"""
+    lo, hi = 0, len(self.sa)
+    for c in reversed(as_codes(pattern).tolist()):
+      lo, hi = self._lf(c, lo, hi)
+      if lo >= hi:
+        return 0, 0
+    return lo, hi
+
+  def count(self, pattern: 'str|np.ndarray') -> int:
+    lo, hi = self.interval(pattern)
+    return hi - lo
+
+  def positions(self, pattern: 'str|np.ndarray') -> list[int]:
+    lo, hi = self.interval(pattern)
+    return np.sort(self.sa[lo:hi]).tolist()
+
+  def positions_approx(self, pattern: 'str|np.ndarray', d: int) -> list[int]:
+    """Start positions of all windows within Hamming distance d of pattern.
+    Backward search branches on every base, spending one unit of the mismatch budget per substitution."""
+    pcodes = as_codes(pattern).tolist()
+    intervals = []
+    def search(i, lo, hi, budget):
+      if i < 0:
+        intervals.append((lo, hi))
+        return
+      for c in range(4):
+        cost = 0 if c == pcodes[i] else 1
+        if cost > budget:
+          continue
+        nlo, nhi = self._lf(c, lo, hi)
+        if nlo < nhi:
+          search(i - 1, nlo, nhi, budget - cost)
+    search(len(pcodes) - 1, 0, len(self.sa), d)
+    if not intervals:
+      return []
+    return np.sort(np.concatenate([self.sa[lo:hi] for (lo, hi) in intervals])).tolist()
+
+  def count_approx(self, pattern: 'str|np.ndarray', d: int) -> int:
+    return len(self.positions_approx(pattern, d))
+
+def index_path(dataset_path: str) -> str:
+  return dataset_path + INDEX_SUFFIX
+
+def load_or_build(key: str) -> FMIndex:
+  """The index of a dataset in constants.DATASETS, rebuilt only when the input is newer than the saved index"""
+  dataset_path = constants.DATASETS[key]
+  path = index_path(dataset_path)
+  if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(dataset_path):
+    start = time.perf_counter()
+    index = FMIndex.load(path)
+    index.stats['load_seconds'] = time.perf_counter() - start
+    index.stats['loaded'] = True
+    logging.info(f"loaded index for {key} from {path}: {index.stats}")
+    return index
+  index = FMIndex.build(constants.dataset(key))
+  index.save(path)
+  index.stats['loaded'] = False
+  logging.info(f"built index for {key} and saved to {path}: {index.stats}")
+  return index
+
+def query_latency(index: FMIndex, patterns: list[str], d: int = 0) -> float:
+  """Mean seconds per positions query (exact when d=0)"""
+  start = time.perf_counter()
+  for pattern in patterns:
+    if d == 0:
+      index.positions(pattern)
+    else:
+      index.positions_approx(pattern, d)
+  return (time.perf_counter() - start) / max(len(patterns), 1)
+
+## TESTS
+def test_suffix_array():
+  for text in ['GATATATGCATATACTT', 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA', 'A', 'ACGT'*20]:
+    expected = sorted(range(len(text)), key=lambda i: text[i:])
+    assert suffix_array(encode(text)).tolist() == expected
+
+def test_fm_index(tmp_path):
+  text = 'CGCCCGAATCCAGAACGCATTCCCATATTTCGGGACCACTGGCCTCCACGGTACGGACGTCAATCAAAT' * 3
+  index = FMIndex.build(text)
+  for pattern in ['CC', 'ATTC', 'CAATCAAATCG', 'GGGG', 'T']:
+    expected = [i for i in range(len(text)-len(pattern)+1) if text[i:i+len(pattern)] == pattern]
+    assert index.positions(pattern) == expected
+    assert index.count(pattern) == len(expected)
+  def hamming_positions(pattern, d):
+    m = len(pattern)
+    return [i for i in range(len(text)-m+1) if sum(a != b for a, b in zip(text[i:i+m], pattern)) <= d]
+  for (pattern, d) in [('ATTCTGGA', 3), ('CCA', 1), ('AAAAA', 2), ('GATTACA', 0)]:
+    assert index.positions_approx(pattern, d) == hamming_positions(pattern, d)
+  path = str(tmp_path / ('genome' + INDEX_SUFFIX))
+  index.save(path)
+  loaded = FMIndex.load(path)
+  assert loaded.positions('ATTC') == index.positions('ATTC')
+  assert loaded.stats['disk_bytes'] > 0
+  assert loaded.stats['build_seconds'] == index.stats['build_seconds']
+
+def test_load_or_build(tmp_path, monkeypatch):
+  genome = tmp_path / 'genome.txt'
+  genome.write_text('CGCCCGAATCCAGAACGCATTCCCATATTTCGGGACCACTGG\n')
+  monkeypatch.setitem(constants.DATASETS, 'cholera', str(genome))
+  index = load_or_build('cholera')
+  assert not index.stats['loaded'] and os.path.exists(index_path(str(genome)))
+  assert index.positions('CCA') == [9, 22, 35]
+  #the saved index is reused while the input is unchanged
+  saved_mtime = os.path.getmtime(index_path(str(genome)))
+  index = load_or_build('cholera')
+  assert index.stats['loaded'] and index.stats['build_seconds'] >= 0
+  assert os.path.getmtime(index_path(str(genome))) == saved_mtime
+  assert index.positions('CCA') == [9, 22, 35]
+  assert query_latency(index, ['CCA', 'GG'], d=1) > 0
+  #and rebuilt once the input is newer
+  genome.write_text('CCACCA\n')
+  os.utime(genome, (saved_mtime + 10, saved_mtime + 10))
+  index = load_or_build('cholera')
+  assert not index.stats['loaded'] and index.positions('CCA') == [0, 3]
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
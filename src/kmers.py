@@ -0,0 +1,209 @@
+"""Integer-coded k-mer counting.
+
+A k-mer is coded as a base-4 integer with its first base in the most significant digit
+(see packed.py for the base codes), so codes sort in the same order as the strings.
+Codes are uint64, which limits k to 32.
+"""
+import sys
+
+import numpy as np
+import pytest
+
+from packed import PackedGenome, as_codes, decode
+
+MAX_K = 32
+DENSE_LIMIT = 1 << 24 #largest 4^k table counted with bincount (128MB of int64 counts)
+_LOW_BITS = np.uint64(0x5555555555555555) #the low bit of every 2-bit base
+_BYTE_POPCOUNT = np.array([bin(b).count('1') for b in range(256)], dtype=np.uint8)
+
+def kmer_codes(text: 'str|PackedGenome|np.ndarray', k: int) -> np.ndarray:
+  """The code of every k-mer window of text, in order of position"""
+  if not 0 < k <= MAX_K:
+    raise ValueError(f"k must be between 1 and {MAX_K}, got {k}")
+  codes = as_codes(text)
+  n = len(codes) - k + 1
+  if n <= 0:
+    return np.zeros(0, dtype=np.uint64)
+  kcodes = np.zeros(n, dtype=np.uint64)
+  for j in range(k):
+    kcodes <<= np.uint64(2)
+    kcodes |= codes[j:j+n]
+  return kcodes
+
+def canonical_kmer_codes(text: 'str|PackedGenome|np.ndarray', k: int) -> np.ndarray:
+  """The code of the smaller of each window and its reverse complement.
+  Forward and reverse-complement codes are built together, one shift per base of the window."""
+  if not 0 < k <= MAX_K:
+    raise ValueError(f"k must be between 1 and {MAX_K}, got {k}")
+  codes = as_codes(text)
+  n = len(codes) - k + 1
+  if n <= 0:
+    return np.zeros(0, dtype=np.uint64)
+  fwd = np.zeros(n, dtype=np.uint64)
+  rc = np.zeros(n, dtype=np.uint64)
+  for j in range(k):
+    fwd <<= np.uint64(2)
+    fwd |= codes[j:j+n]
+    rc |= (3 - codes[j:j+n]).astype(np.uint64) << np.uint64(2 * j)
+  return np.minimum(fwd, rc)
+
+def encode_kmer(kmer: str) -> int:
+  return int(kmer_codes(kmer, len(kmer))[0])
+
+def decode_kmers(kcodes: np.ndarray, k: int) -> list[str]:
+  """Decodes an array of k-mer codes back into strings"""
+  kcodes = np.asarray(kcodes, dtype=np.uint64)
+  shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+  digits = ((kcodes[:, None] >> shifts) & np.uint64(3)).astype(np.uint8)
+  text = decode(digits.ravel())
+  return [text[i:i+k] for i in range(0, len(text), k)]
+
+def decode_kmer(kcode: int, k: int) -> str:
+  return decode_kmers(np.array([kcode], dtype=np.uint64), k)[0]
+
+def reverse_complement_codes(kcodes: np.ndarray, k: int) -> np.ndarray:
+  """Codes of the reverse complements of k-mer codes"""
+  comp = np.asarray(kcodes, dtype=np.uint64) ^ np.uint64(4**k - 1) #complementing a base code is c^3
+  rc = np.zeros_like(comp)
+  for _ in range(k):
+    rc = (rc << np.uint64(2)) | (comp & np.uint64(3))
+    comp = comp >> np.uint64(2)
+  return rc
+
+def unique_codes(kcodes: np.ndarray) -> np.ndarray:
+  """Sorted distinct codes by sort and compare (plain np.unique takes a much slower hashing path on some numpy versions)"""
+  kcodes = np.sort(kcodes, axis=None)
+  if len(kcodes) == 0:
+    return kcodes
+  keep = np.empty(len(kcodes), dtype=bool)
+  keep[0] = True
+  np.not_equal(kcodes[1:], kcodes[:-1], out=keep[1:])
+  return kcodes[keep]
+
+def popcount(x: np.ndarray) -> np.ndarray:
+  """Set bits of each uint64, with a byte table on numpy versions without bitwise_count"""
+  if hasattr(np, 'bitwise_count'):
+    return np.bitwise_count(x)
+  x = np.ascontiguousarray(x, dtype=np.uint64)
+  return _BYTE_POPCOUNT[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+def code_mismatches(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  """Hamming distance between k-mer codes (broadcasting): XOR, fold each base's 2 bits into one, popcount"""
+  x = np.bitwise_xor(a, b, dtype=np.uint64)
+  return popcount((x | (x >> np.uint64(1))) & _LOW_BITS)
+
+def count_kmer_codes(kcodes: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Counts k-mer codes. Returns the distinct codes (sorted) and their counts.
+  Uses a dense bincount table when 4^k is small enough, and sort/unique otherwise.
+  """
+  if len(kcodes) == 0:
+    return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+  if 4**k <= DENSE_LIMIT:
+    table = np.bincount(kcodes.astype(np.intp), minlength=4**k)
+    present = np.flatnonzero(table)
+    return present.astype(np.uint64), table[present]
+  return np.unique(kcodes, return_counts=True)
+
+def count_kmers(text: 'str|PackedGenome|np.ndarray', k: int) -> tuple[np.ndarray, np.ndarray]:
+  return count_kmer_codes(kmer_codes(text, k), k)
+
+def count_canonical_kmers(text: 'str|PackedGenome|np.ndarray', k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Strand-merged counts: each k-mer and its reverse complement are counted under the smaller code.
+  Only the result is about half the size of the strand-specific counts: the dense path of count_kmer_codes
+  still allocates the full 4^k table (of which only canonical codes are ever nonzero)."""
+  return count_kmer_codes(canonical_kmer_codes(text, k), k)
+
+def most_frequent_kmers(text: 'str|PackedGenome|np.ndarray', k: int) -> tuple[np.ndarray, int]:
+  """Codes of the most frequent k-mers in text, and their count"""
+  kmers, counts = count_kmers(text, k)
+  if len(counts) == 0:
+    return kmers, 0
+  max_count = counts.max()
+  return kmers[counts == max_count], int(max_count)
+
+def clump_kmer_codes(text: 'str|PackedGenome|np.ndarray', k: int, L: int, t: int) -> np.ndarray:
+  """Codes of the distinct k-mers forming (L, t)-clumps in text.
+  A k-mer forms a clump when occurrence i and occurrence i+t-1 in its sorted position list
+  start at most L-k bases apart, so one sort plus a vectorized comparison finds every clump.
+  """
+  kcodes = kmer_codes(text, k)
+  if L < k or len(kcodes) == 0:
+    return np.zeros(0, dtype=np.uint64)
+  if t <= 1:
+    return np.unique(kcodes)
+  positions = np.arange(len(kcodes))
+  if 4**k <= DENSE_LIMIT:
+    #k-mers occurring fewer than t times in the whole text can never clump
+    table = np.bincount(kcodes.astype(np.intp), minlength=4**k)
+    positions = positions[table[kcodes] >= t]
+  order = positions[np.argsort(kcodes[positions], kind='stable')]
+  sorted_codes = kcodes[order]
+  span = t - 1
+  hits = (sorted_codes[span:] == sorted_codes[:-span]) & (order[span:] - order[:-span] <= L - k)
+  return np.unique(sorted_codes[span:][hits])
+
+## TESTS
+def test_kmer_codes():
+  assert kmer_codes('ACGT', 2).tolist() == [0b0001, 0b0110, 0b1011]
+  assert kmer_codes('AC', 3).tolist() == []
+  assert encode_kmer('TTTT') == 255
+  assert decode_kmer(encode_kmer('GATTACA'), 7) == 'GATTACA'
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  assert decode_kmers(kmer_codes(text, 5), 5) == [text[i:i+5] for i in range(len(text)-4)]
+  assert kmer_codes(PackedGenome.from_str(text), 5).tolist() == kmer_codes(text, 5).tolist()
+  with pytest.raises(ValueError):
+    kmer_codes(text, 33)
+
+def test_reverse_complement_codes():
+  kmers = ['AAAACCCGGT', 'ACGT', 'GATTACA']
+  rcs = ['ACCGGGTTTT', 'ACGT', 'TGTAATC']
+  for kmer, rc in zip(kmers, rcs):
+    assert decode_kmer(int(reverse_complement_codes(np.array([encode_kmer(kmer)]), len(kmer))[0]), len(kmer)) == rc
+  codes = np.arange(4**5, dtype=np.uint64)
+  assert (reverse_complement_codes(reverse_complement_codes(codes, 5), 5) == codes).all()
+
+def test_unique_codes():
+  assert unique_codes(np.array([5, 1, 5, 3, 1], dtype=np.uint64)).tolist() == [1, 3, 5]
+  assert unique_codes(np.array([[2, 2], [0, 7]], dtype=np.uint64)).tolist() == [0, 2, 7]
+  assert unique_codes(np.zeros(0, dtype=np.uint64)).tolist() == []
+
+def test_code_mismatches():
+  a, b = 'GATTACAGATTACAGATTACAGATTACAGATT', 'GTTTACCGATTACAGATTACAGATTACAGTTA'
+  assert code_mismatches(np.uint64(encode_kmer(a)), np.uint64(encode_kmer(b))) == sum(x != y for x, y in zip(a, b))
+  kcodes = kmer_codes('ACGTTGCATG', 3)
+  assert code_mismatches(kcodes[:, None], kcodes[None, :]).diagonal().tolist() == [0]*8
+  assert code_mismatches(kcodes, np.uint64(encode_kmer('TTG'))).tolist() == [2, 3, 2, 0, 2, 3, 3, 1]
+
+def test_count_kmers():
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  for k in [1, 4, 13]: #13 is past the dense limit
+    kmers, counts = count_kmers(text, k)
+    expected = {}
+    for i in range(len(text)-k+1):
+      expected[text[i:i+k]] = expected.get(text[i:i+k], 0) + 1
+    assert dict(zip(decode_kmers(kmers, k), counts.tolist())) == expected
+  kmers, count = most_frequent_kmers(text, 4)
+  assert decode_kmers(kmers, 4) == ['CATG', 'GCAT'] and count == 3
+
+def test_count_canonical_kmers():
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  complement = str.maketrans('ACGT', 'TGCA')
+  for k in [1, 4, 7, 13]:
+    expected = {}
+    for i in range(len(text)-k+1):
+      kmer = text[i:i+k]
+      canon = min(kmer, kmer.translate(complement)[::-1])
+      expected[canon] = expected.get(canon, 0) + 1
+    kmers, counts = count_canonical_kmers(text, k)
+    assert dict(zip(decode_kmers(kmers, k), counts.tolist())) == expected
+
+def test_clump_kmer_codes():
+  text = 'CGGACTCGACAGATGTGAAGAACGACAATGTGAAGACTCGACACGACAGAGTGAAGAGAAGAGGAAACATTGTAA'
+  assert decode_kmers(clump_kmer_codes(text, 5, 50, 4), 5) == ['CGACA', 'GAAGA']
+  assert decode_kmers(clump_kmer_codes(text, 13, 50, 2), 13) == []
+  assert decode_kmers(clump_kmer_codes('AAAAC', 2, 3, 2), 2) == ['AA']
+  assert decode_kmers(clump_kmer_codes('AACAA', 2, 4, 2), 2) == []
+  assert decode_kmers(clump_kmer_codes('AACAA', 2, 5, 2), 2) == ['AA']
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
@@ -1,6 +1,6 @@
 from collections import defaultdict
 import itertools
-import math
+import logging
 import random
 import sys
 from typing import Iterable, Iterator, Tuple
@@ -9,18 +9,38 @@ import pytest
 import numpy as np
 import pandas as pd
 import constants
+from fmindex import FMIndex
+import kmers as kmers_engine
+import matching
+import motifs as motifs_engine
+import neighbors as neighbors_engine
+from packed import PackedGenome, as_codes, as_str, find_exact
+import parallel
+import skew
 from util import print_highlight_motifs, print_sep
 
-def freq_map_kmers(text: str, k: int) -> dict[str, int]:
+def freq_map_kmers(text: str|PackedGenome, k: int, backend='numpy', canonical=False) -> dict[str, int]:
+  """Counts of each k-mer in text. With canonical=True a k-mer and its reverse complement
+  are counted together under canonicalize_word of the k-mer. The numpy backend needs k <= MAX_K"""
+  if backend == 'numpy' and k <= kmers_engine.MAX_K:
+    count = kmers_engine.count_canonical_kmers if canonical else kmers_engine.count_kmers
+    kmers, counts = count(text, k)
+    return dict(zip(kmers_engine.decode_kmers(kmers, k), counts.tolist()))
+  text = as_str(text)
   n = len(text)
   freqs = {}
   for i in range(n-k+1):
     kmer = text[i:i+k]
+    if canonical:
+      kmer = canonicalize_word(kmer)
     freqs[kmer] = freqs.get(kmer, 0) + 1
   return freqs
 
-def frequent_words(text: str, k: int) -> list[str]:
-  freq_map = freq_map_kmers(text, k)
+def frequent_words(text: str|PackedGenome, k: int, backend='numpy') -> list[str]:
+  if backend == 'numpy' and k <= kmers_engine.MAX_K:
+    kmers, _ = kmers_engine.most_frequent_kmers(text, k)
+    return kmers_engine.decode_kmers(kmers, k)
+  freq_map = freq_map_kmers(text, k, backend)
   max_freq = max(freq_map.values())
   freq_words = []
   for (kmer,freq) in freq_map.items():
@@ -31,13 +51,21 @@ def frequent_words(text: str, k: int) -> list[str]:
 def reverse(text: str) -> str:
   return text[::-1]
 
+_COMPLEMENT_TABLE = str.maketrans(constants.BASES_COMPLEMENTS)
+
 def complement(text: str) -> str:
-  return text.translate(str.maketrans(constants.BASES_COMPLEMENTS))
+  return text.translate(_COMPLEMENT_TABLE)
 
-def reverse_complement(text: str) -> str:
+def reverse_complement(text: str|PackedGenome) -> str|PackedGenome:
+  if isinstance(text, PackedGenome):
+    return text.reverse_complement()
   return complement(reverse(text))
 
-def pattern_match(text: str,pattern: str) -> list[int]:
+def pattern_match(text: str|PackedGenome|FMIndex, pattern: str|PackedGenome) -> list[int]:
+  if isinstance(text, FMIndex):
+    return text.positions(as_str(pattern))
+  if isinstance(text, PackedGenome) or isinstance(pattern, PackedGenome):
+    return find_exact(as_codes(text), as_codes(pattern))
   starts = []
   for i in range(len(text) - len(pattern) + 1):
     if text[i:i+len(pattern)] == pattern:
@@ -45,17 +73,20 @@ def pattern_match(text: str,pattern: str) -> list[int]:
   return starts
 
 # Optimized version using sliding windows
-def find_clumps(text: str, k: int, L: int, t: int) -> list[str]:
+def find_clumps(text: str|PackedGenome, k: int, L: int, t: int, backend='numpy') -> list[str]:
   """Clump Finding Problem: Find patterns forming clumps in a string.
         Input: A string Genome, and integers k, L, and t.
         Output: All distinct k-mers forming (L, t)-clumps in Genome.
   """
+  if backend == 'numpy':
+    return kmers_engine.decode_kmers(kmers_engine.clump_kmer_codes(text, k, L, t), k)
+  text = as_str(text)
   n = len(text)
   clump_kmers = set()
   kmer_dict = {}
 
   window = text[:L]
-  kmer_dict = freq_map_kmers(window, k)
+  kmer_dict = freq_map_kmers(window, k, backend='python')
   kmers_above_t = [k for (k,v) in kmer_dict.items() if v >= t]
   clump_kmers.update(kmers_above_t)
   
@@ -75,22 +106,25 @@ def find_clumps(text: str, k: int, L: int, t: int) -> list[str]:
 
   return sorted(list(clump_kmers))
 
-def minimum_skew(text: str) -> list[int]:
+def minimum_skew(text: str|PackedGenome, backend='numpy') -> list[int]:
+  if backend == 'numpy':
+    return skew.min_skew_positions(text)
+  text = as_str(text)
   skew_map = {'G': 1, 'C': -1, 'A': 0, 'T': 0} #contribution to skew of each base
   min_skew = float('inf')
   indices = []
-  skew = 0
+  curr = 0
   for i, base in enumerate(text):
-    skew += skew_map[base]
-    if skew < min_skew:
+    curr += skew_map[base]
+    if curr < min_skew:
       indices = [i+1]
-      min_skew = skew
-    elif skew == min_skew:
+      min_skew = curr
+    elif curr == min_skew:
       indices.append(i+1)
   return indices
 
 
-def hamming_distance(s1: str, s2: str) -> int:
+def hamming_distance(s1: str|PackedGenome, s2: str|PackedGenome) -> int:
   """
   Hamming Distance Problem: Compute the Hamming distance between two strings.
     Input: Two strings of equal length.
@@ -99,6 +133,9 @@ def hamming_distance(s1: str, s2: str) -> int:
   """
   l1 = len(s1)
   l2 = len(s2)
+  if isinstance(s1, PackedGenome) or isinstance(s2, PackedGenome):
+    m = min(l1,l2)
+    return int(np.count_nonzero(as_codes(s1)[:m] != as_codes(s2)[:m])) + max(l1,l2) - m
   dist = 0
   for i in range(min(l1,l2)):
     dist += 1 if s1[i] != s2[i] else 0
@@ -127,28 +164,38 @@ def hamming_distance(s1: str, s2: str) -> int:
 #     # starts.append(len(text) - len(pattern))
 #   return starts
 
-def pattern_match_approx(text: str,pattern: str,d: int) -> list[int]:
+def pattern_match_approx(text: str|PackedGenome, pattern: str|PackedGenome, d: int, backend='numpy') -> list[int]:
   """
   Approximate Pattern Matching Problem: Find all approximate occurrences of a pattern in a string.
     * Input: Strings Pattern and Text along with an integer d.
     * Output: All starting positions where Pattern appears as a substring of Text with at most d mismatches.
   """
+  if backend == 'numpy':
+    return matching.approx_match_positions(text, pattern, d).tolist()
+  text, pattern = as_str(text), as_str(pattern)
   starts = []
   for i in range(len(text) - len(pattern) + 1):
     if hamming_distance(text[i:i+len(pattern)],pattern) <= d:
       starts.append(i)
   return starts
 
-def pattern_count_approx(text: str, pattern: str, d: int) -> int:
-  return len(pattern_match_approx(text,pattern,d))
+def pattern_count_approx(text: str|PackedGenome|FMIndex, pattern: str|PackedGenome, d: int, backend='numpy') -> int:
+  if isinstance(text, FMIndex):
+    return text.count_approx(as_str(pattern), d)
+  if backend == 'numpy':
+    return len(matching.approx_match_positions(text, pattern, d))
+  return len(pattern_match_approx(text,pattern,d,backend))
 
 #TODO: What is the runtime of this function? How can it be optimized?
-def neighbors_lt(pattern: str, d: int) -> set[str]:
+#The numpy backend XORs the k-mer code with precomputed mismatch masks and caches results (see neighbors.py)
+def neighbors_lt(pattern: str, d: int, backend='numpy') -> set[str]:
   """
   Neighbors: Find the d-neighborhood of a string (all dist < d).
     Input: A string Pattern and an integer d.
     Output: The collection of strings Neighbors(Pattern, d).
   """
+  if backend == 'numpy' and 0 < len(pattern) <= kmers_engine.MAX_K:
+    return neighbors_engine.neighbors(pattern, d)
 
   #T(n) = runtime for pattern of length n (fixed d)
   #H(n) = number of neighbors for length n (fixed d)
@@ -159,7 +206,7 @@ def neighbors_lt(pattern: str, d: int) -> set[str]:
     return set([pattern])
   if len(pattern) == 1:
     return set(['A', 'T', 'C', 'G'])
-  suffix_nbrs = neighbors_lt(pattern[1:], d) 
+  suffix_nbrs = neighbors_lt(pattern[1:], d, backend) 
   nbrs = set([pattern])
   for snbr in suffix_nbrs:
     if hamming_distance(snbr, pattern[1:]) < d:
@@ -174,17 +221,20 @@ def neighbor_lt_complement(pattern: str, d: int) -> set[str]:
   rcnbrs = neighbors_lt(reverse_complement(pattern),d)
   return set.union(nbrs,rcnbrs)
 
-def frequent_words_with_mismatches(text: str, k: int, d: int) -> Tuple[list[str],int]:
+def frequent_words_with_mismatches(text: str|PackedGenome, k: int, d: int, backend='numpy') -> Tuple[list[str],int]:
   """
   Frequent Words with Mismatches Problem.
     Input: A string Text as well as integers k and d. (You may assume k ≤ 12 and d ≤ 3.)
     Output: All most frequent k-mers with up to d mismatches in Text.
   """
+  if backend == 'numpy' and 4**k <= kmers_engine.DENSE_LIMIT:
+    return neighbors_engine.most_frequent_with_mismatches(text, k, d)
+  text = as_str(text)
   freq_map = {}
   n = len(text)
   for i in range(n-k+1):
     pattern = text[i:i+k]
-    nbrs = neighbors_lt(pattern, d)
+    nbrs = neighbors_lt(pattern, d, backend)
     for nbr in nbrs:
       freq_map[nbr] = freq_map.get(nbr,0) + 1
   max_freq = max(freq_map.values())
@@ -197,10 +247,11 @@ def frequent_words_with_mismatches_complements_slow(text: str, k: int, d: int, d
   Brute Force Version: O(4^k * (k + n))
   """
   kmers = [''.join(x) for x in itertools.product('ATGC', repeat=k)]
+  codes = as_codes(text) #encode once for all 4^k scans
   counts = {}
   for kmer in kmers:
-    count_pattern = pattern_count_approx(text, kmer, d)
-    count_rc_pattern = pattern_count_approx(text, reverse_complement(kmer), d)
+    count_pattern = pattern_count_approx(codes, kmer, d)
+    count_rc_pattern = pattern_count_approx(codes, reverse_complement(kmer), d)
     total_count = count_pattern + count_rc_pattern
     counts[kmer] = total_count
 
@@ -212,18 +263,22 @@ def frequent_words_with_mismatches_complements_slow(text: str, k: int, d: int, d
   else:
     return (max_freq_kmers, max_count)
 
-def frequent_words_with_mismatches_complements(text: str, k: int, d: int, debug=False) -> Tuple[list[str],int]|list[str]:
+def frequent_words_with_mismatches_complements(text: str|PackedGenome, k: int, d: int, debug=False, backend='numpy') -> Tuple[list[str],int]|list[str]:
   """
   Find the most frequent k-mers (with mismatches and reverse complements) in a DNA string.
   Optimized version
   """
+  if backend == 'numpy' and 4**k <= kmers_engine.DENSE_LIMIT:
+    max_freq_kmers, max_freq = neighbors_engine.most_frequent_with_mismatches(text, k, d, reverse_complements=True)
+    return (max_freq_kmers, max_freq) if debug else max_freq_kmers
+  text = as_str(text)
   freq_map = {}
   for i in range(len(text)-k+1):
     pattern = text[i:i+k]
     #CANNOT union the sets here because if a pattern appears as a neighbor of both the pattern and the complement it should be counted twice
-    nbrs = neighbors_lt(pattern, d)
+    nbrs = neighbors_lt(pattern, d, backend)
     pattern_c = reverse_complement(pattern)
-    nbrs_c = neighbors_lt(pattern_c, d)
+    nbrs_c = neighbors_lt(pattern_c, d, backend)
     for nbr in nbrs:
       freq_map[nbr] = freq_map.get(nbr,0) + 1
     for nbrc in nbrs_c:
@@ -262,32 +317,17 @@ def canonicalize_word(word: str) -> str:
   return min(word, reverse_complement(word))
 
 def canonicalize_freq_map(map: dict[str,int]) -> dict[str,int]:
+  """Merges the counts of each word and its reverse complement under the canonical word.
+  To count canonically from the start, use freq_map_kmers(text, k, canonical=True)"""
+  canon_map = {}
   for key,val in map.items():
-    revc = reverse_complement(key)
-    if val == -1 or map[revc] == -1:
-      continue
-    
     canon = canonicalize_word(key)
-    other = reverse_complement(canon)
-    map[canon] += map[other]
-    map[other] = -1
-
-  for key, val in list(map.items()):
-    if val == -1:
-      del map[key]
-  return map
-
-def gc_skew_iter(genome: str) -> Iterator[int]:
-  """Yields the #G-#C skew at each position as an iterator"""
-  print(f"genome: {genome}")
-  skew_map = {'G': 1, 'C': -1, 'A': 0, 'T': 0} #contribution to skew of each base
-  skews = []
-  curr = 0
-  yield 0
-  for char in genome:
-    curr += skew_map[char]
-    skews.append(curr)
-    yield curr
+    canon_map[canon] = canon_map.get(canon, 0) + val
+  return canon_map
+
+def gc_skew_iter(genome: str|PackedGenome) -> Iterator[int]:
+  """Yields the #G-#C skew at each position as an iterator (see skew.skew_array for the whole array)"""
+  yield from skew.skew_array(genome).tolist()
 
 #each string has n-k kmers
 #each kmer has sum( (k choose i) * 3^i ) d-nbrs ~= 4^d
@@ -302,42 +342,33 @@ def motif_enumerate_bruteforce(strings, k, d):
       pattern = string[i:i+k]
       dnbrs = neighbors_lt(pattern, d)
       for approx_pattern in dnbrs:
-        appears_all = all([pattern_count_approx(string2,approx_pattern,d) > 0 for string2 in strings])
+        appears_all = all([pattern_count_approx(string2,approx_pattern,d,backend='python') > 0 for string2 in strings])
         if appears_all:
           motifs.add(approx_pattern)
   return list(motifs)
 
+def motif_enumerate(strings, k, d):
+  """All (k, d)-motifs, sorted, by intersecting the d-neighborhoods of the strings (see neighbors.py)"""
+  return kmers_engine.decode_kmers(neighbors_engine.motif_enumeration_codes(strings, k, d), k)
+
 def profile_matrix_as_dataframe(matrix: np.ndarray) -> pd.DataFrame:
   """The rows of matrix must be in order of BASES - A,C,G,T"""
   assert(matrix.shape[0] == 4)
   return pd.DataFrame(matrix, index=constants.BASES)
 
-def count_motif_matrix(motifs: np.ndarray, pseudo_counts=False) -> pd.DataFrame:
+def count_motif_matrix(motifs: np.ndarray, pseudo_counts=False) -> np.ndarray:
   """Count the number of bases at each position across the given motifs
-  Input: motifs is a 4xN ndarray, pseudo_counts will add 1 to each count for non-zero probabilities
+  Input: motifs is a txk ndarray of bases (or base codes), pseudo_counts will add 1 to each count for non-zero probabilities
   """
-  count_matrix = (
-    np.ones((4, motifs.shape[1]), dtype=int) if pseudo_counts 
-    else np.zeros((4, motifs.shape[1]), dtype=int)
-  )
-  # Iterate over each column of the motif matrix and count the occurrences of each nucleotide
-  for j in range(motifs.shape[1]):
-    for i, nucleotide in enumerate(constants.BASES):
-        count_matrix[i, j] += np.sum(motifs[:, j] == nucleotide)
-  return count_matrix
+  return motifs_engine.count_matrix(motifs_engine.encode_motifs(motifs), pseudo_counts)
 
 def profile_motif_matrix(motifs: np.ndarray, pseudo_counts=False) -> pd.DataFrame:
-  count_matrix = count_motif_matrix(motifs, pseudo_counts)
-  prob_matrix = count_matrix / np.sum(count_matrix, axis=0)
-  labeled_matrix = pd.DataFrame(prob_matrix, index=constants.BASES)
-  return labeled_matrix
-
-def score_motif_profile_entropy(profile: np.ndarray) -> float:
-  for i in range(profile.shape[0]):
-    for j in range(profile.shape[1]):
-      profile[i, j] = 0 if profile[i,j] == 0 else -1 * profile[i, j] * math.log(profile[i,j], 2)
-  sum = np.sum(profile[:,:])
-  return sum
+  prob_matrix = motifs_engine.profile_matrix(motifs_engine.encode_motifs(motifs), pseudo_counts)
+  return profile_matrix_as_dataframe(prob_matrix)
+
+def score_motif_profile_entropy(profile: np.ndarray) -> float|np.ndarray:
+  """Entropy of a 4xk profile, or of each profile in a (...,4,k) batch. The profile is not modified."""
+  return motifs_engine.profile_entropy(profile)
 
 def score_motif_counts(counts: pd.DataFrame, pseudo_counts=True) -> int:
   max_counts = np.max(counts, axis=0)
@@ -346,11 +377,15 @@ def score_motif_counts(counts: pd.DataFrame, pseudo_counts=True) -> int:
   total = np.sum(col_scores)
   return int(total) #convert numpy int to int for json serialization
 
-def median_strings(texts, k):
+def median_strings(texts, k, backend='numpy'):
   """Computes all median strings
 Input: An integer k, followed by a space-separated collection of strings Dna.
 Output: A k-mer Pattern that minimizes d(Pattern, Dna) among all possible choices of k-mers.
+  The numpy backend is a branch-and-bound search over prefixes (see motifs.median_string_codes).
   """
+  if backend == 'numpy':
+    medians, _ = motifs_engine.median_string_codes([as_codes(text) for text in texts], k)
+    return kmers_engine.decode_kmers(medians, k)
   all_kmers = [''.join(x) for x in itertools.product(constants.BASES, repeat=k)]
   min_d, best_kmers = float('inf'), []
   for kmer in all_kmers:
@@ -365,114 +400,82 @@ Output: A k-mer Pattern that minimizes d(Pattern, Dna) among all possible choice
       best_kmers.append(kmer)
   return sorted(best_kmers)
 
-def profile_most_probable_kmer(text: str, profile_df: pd.DataFrame, k: int):
+def profile_most_probable_kmer(text: str, profile_df: pd.DataFrame|np.ndarray, k: int):
   """Profile-most Probable k-mer Problem: Find a Profile-most probable k-mer in a string.
   Ties are broken by returning the first most probable k-mer
     Input: A string text, an integer k, and a 4 × k dataframe profile_df.
     Output: A Profile-most probable k-mer in Text.
   """
-  n = len(text)
-  best_prob,best_kmer = 0, text[:k]
-  profile_matrix = profile_df.values
-  locs = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
-  for i in range(n-k+1):
-    pattern = text[i:i+k]
-    prob_list = [profile_matrix[locs[c]][pi] for (pi,c) in enumerate(pattern)]
-    prob = np.prod(prob_list)
-    if prob > best_prob:
-      best_prob,best_kmer = prob,pattern
-  return best_kmer
+  profile_matrix = profile_df.values if isinstance(profile_df, pd.DataFrame) else profile_df
+  i = motifs_engine.most_probable_window(as_codes(text), motifs_engine.log_profile(profile_matrix[:, :k]))
+  return text[i:i+k]
 
-def greedy_motif_search(texts: list[str],k: int, pseudo_counts=False, debug=False) -> list[str]|Tuple[list[str],int]:
+def greedy_motif_search(texts: list[str],k: int, pseudo_counts=False, debug=False, objective='counts') -> list[str]|Tuple[list[str],int]:
   """Greedy Motif Search
     Input: Integers k and t, followed by a space-separated collection of strings Dna.
     Output: A collection of strings BestMotifs resulting from applying GreedyMotifSearch(Dna, k, t). If at any step you find more than one Profile-most probable k-mer in a given string, use the one occurring first.
   """
-  t,n = len(texts),len(texts[0])
-  best_motifs, best_score = np.array([list(seq[:k]) for seq in texts]), float('inf')
-  for motif in [texts[0][i:i+k] for i in range(n-k+1)]:
-    motifs = np.array([list(motif)])
-    for j in range(1,t):
-      profile = profile_motif_matrix(motifs,pseudo_counts) 
-      kmers = np.array(list(profile_most_probable_kmer(texts[j], profile, k)))
-      motifs = np.vstack((motifs, kmers))
-    if score_motif_counts(count_motif_matrix(motifs)) < best_score:
-      best_motifs = motifs
-      best_score = score_motif_counts(count_motif_matrix(motifs))
-  
-  best_motifs_1d = [''.join(row) for row in best_motifs]
+  best_motifs, best_score = motifs_engine.greedy_search_batched([as_codes(text) for text in texts], k, pseudo_counts, objective)
+  best_motifs_1d = motifs_engine.decode_motifs(best_motifs)
   if debug:
     return best_motifs_1d, best_score
   else:
     return best_motifs_1d
 
-def randomized_motif_search(texts, k, pseudo_counts=True, iterations=1000, debug=False):
-  t,n = len(texts), len(texts[0])
+def log_worker_stats(search: str, stats: list[dict]) -> None:
+  """Logs the throughput of each worker of a parallel search (units are restarts or chains)"""
+  for worker in stats:
+    logging.info(f"{search} worker {worker['worker']}: {worker['units']} units in {worker['seconds']:.2f}s "
+                 f"({worker['units_per_second']:.1f}/s), best score {worker['score']}")
+
+def randomized_motif_search(texts, k, pseudo_counts=True, iterations=1000, debug=False, workers=1, seed=None, batch_size=1, objective='counts'):
+  """Runs draw from random.Random(seed), or from the random module when seed is None.
+  With workers > 1 the restarts are spread over a process pool (see parallel.py).
+  With batch_size > 1 restarts run batch_size at a time as arrays.
+  objective is 'counts' (score_motif_counts) or 'entropy' (score_motif_profile_entropy)."""
+  encoded = [as_codes(text) for text in texts]
+  if workers > 1:
+    seed = random.getrandbits(63) if seed is None else seed
+    best_motifs, best_score, stats = parallel.randomized_motif_search(encoded, k, iterations, workers, seed, pseudo_counts, batch_size, objective)
+    log_worker_stats('randomized_motif_search', stats)
+    return motifs_engine.decode_motifs(best_motifs), best_score
+  rng = random if seed is None else random.Random(seed)
+  if batch_size > 1 and not debug:
+    best_motifs, best_score = motifs_engine.randomized_search(encoded, k, iterations, pseudo_counts, rng, batch_size, objective)
+    return motifs_engine.decode_motifs(best_motifs), best_score
   best_motifs, best_score = None, float('inf')
   for i in range(iterations):
     if debug and i%50==0: print_sep(f"Iteration {i}")
-    motifs = []
-    for seq in texts:
-      start = random.randint(0,n-k) #N=10, k=5 -> max start = 5
-      kmer = list(seq[start:start+k])
-      motifs.append(kmer)
-    motifs = np.array(motifs)
-    current_score = score_motif_counts(count_motif_matrix(motifs))
+    motifs = motifs_engine.random_motifs(encoded, k, rng)
     if debug and i%50 == 0: 
-      print(f"Chose collection of motifs with score {current_score}:")
-      print_highlight_motifs(texts, [''.join(kmer) for kmer in motifs], color="RED")
-    while True:
-      profile = profile_motif_matrix(motifs, pseudo_counts)
-      new_motifs = np.array([list(profile_most_probable_kmer(text, profile, k)) for text in texts])
-      new_score = score_motif_counts(count_motif_matrix(new_motifs))
-      if new_score < current_score:
-        motifs = new_motifs
-        current_score = new_score
-      else:
-        break
+      print(f"Chose collection of motifs with score {motifs_engine.objective_scores(motifs_engine.count_matrix(motifs), objective)}:")
+      print_highlight_motifs(texts, motifs_engine.decode_motifs(motifs), color="RED")
+    motifs, current_score = motifs_engine.improve_motifs(encoded, motifs, pseudo_counts, objective)
     if debug and i%50 == 0:
       print_sep()
       print(f"Iterated to improve motifs with score {current_score}")
-      print_highlight_motifs(texts, [''.join(kmer) for kmer in motifs], color="RED")
+      print_highlight_motifs(texts, motifs_engine.decode_motifs(motifs), color="RED")
     if current_score < best_score:
       best_score = current_score
       best_motifs = motifs
-  best_motifs_1d = [''.join(row) for row in best_motifs]
+  best_motifs_1d = motifs_engine.decode_motifs(best_motifs)
   return best_motifs_1d, best_score
 
 def weighted_die(weights: Iterable[float]):
   return random.choices(range(len(weights)), weights=weights)[0]
 
-def gibbs_sampling_motif_search(texts: Iterable[str], k: int, iters: int, pseudo_counts=True):
-  t,n = len(texts), len(texts[0])
-  motifs = []
-  for seq in texts:
-    start = random.randint(0,n-k)
-    kmer = list(seq[start:start+k])
-    motifs.append(kmer)
-  motifs = np.array(motifs)
-  best_motifs = motifs
-  curr_score = score_motif_counts(count_motif_matrix(motifs))
-  for i in range(iters):
-    remove = random.randint(0,t-1)
-    removed_motifs = np.delete(motifs, remove, axis=0)
-    profile = profile_motif_matrix(removed_motifs, pseudo_counts)
-    kmers = [texts[remove][i:i+k] for i in range(n-k+1)]
-    kmer_probs = []
-    for kmer in kmers:
-      locs = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
-      prob_list = [profile.values[locs[c]][pi] for (pi,c) in enumerate(kmer)]
-      prob = np.prod(prob_list)
-      kmer_probs.append((kmer,prob))
-    roll = weighted_die([t[1] for t in kmer_probs])
-    new_motifs = np.vstack((motifs[:remove], np.array(list(kmers[roll])), motifs[remove+1:]))
-    new_score = score_motif_counts(count_motif_matrix(new_motifs))
-    motifs = new_motifs
-    if new_score < curr_score:
-      best_motifs = new_motifs
-      curr_score = new_score
-  best_motifs_1d = [''.join(row) for row in best_motifs]
-  return (best_motifs_1d,curr_score)
+def gibbs_sampling_motif_search(texts: Iterable[str], k: int, iters: int, pseudo_counts=True, chains=1, workers=1, seed=None, objective='counts'):
+  """Draws from random.Random(seed), or from the random module when seed is None.
+  With chains > 1, runs independent chains over a process pool of workers (see parallel.py) and keeps the best"""
+  encoded = [as_codes(text) for text in texts]
+  if chains > 1 or workers > 1:
+    seed = random.getrandbits(63) if seed is None else seed
+    best_motifs, best_score, stats = parallel.gibbs_motif_search(encoded, k, iters, chains, workers, seed, pseudo_counts, objective)
+    log_worker_stats('gibbs_sampling_motif_search', stats)
+  else:
+    rng = random if seed is None else random.Random(seed)
+    best_motifs, best_score = motifs_engine.gibbs_sample(encoded, k, iters, pseudo_counts, rng, objective)
+  return (motifs_engine.decode_motifs(best_motifs), best_score)
 
 ## TESTS
 def test_frequent_words_with_mismatches_complements():
@@ -507,11 +510,93 @@ def test_frequent_words_with_mismatches_complements():
   f = frequent_words_with_mismatches_complements(*input)
   assert sorted(f) == ['ACAT','ATGT']
 
+def test_frequent_words_backends():
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  for k in [1,3,4,8]:
+    assert freq_map_kmers(text, k) == freq_map_kmers(text, k, backend='python')
+    assert sorted(frequent_words(text, k)) == sorted(frequent_words(text, k, backend='python'))
+  #raw file reads end in a newline, and k-mers past MAX_K are counted by the python backend
+  assert sorted(frequent_words('ACGTACGT\n', 3)) == ['ACG', 'CGT']
+  long_text = 'ACGT' * 10 + 'A'
+  assert freq_map_kmers(long_text, 33) == freq_map_kmers(long_text, 33, backend='python')
+  assert sorted(frequent_words(long_text, 33)) == sorted(frequent_words(long_text, 33, backend='python'))
+
+def test_find_clumps_backends():
+  text = 'CGGACTCGACAGATGTGAAGAACGACAATGTGAAGACTCGACACGACAGAGTGAAGAGAAGAGGAAACATTGTAA'
+  for (k,L,t) in [(5,50,4),(3,10,2),(4,20,3),(2,5,2)]:
+    assert find_clumps(text, k, L, t) == find_clumps(text, k, L, t, backend='python')
+  #a raw f.read() of a genome file ends in a newline
+  assert find_clumps(text + '\n', 5, 50, 4) == find_clumps(text + '\n', 5, 50, 4, backend='python') == ['CGACA', 'GAAGA']
+
+def test_minimum_skew_backends():
+  text = 'TAAAGACTGCCGAGAGGCCAACACGAGTGCTAGAACGAGGGGCGTAAACGCGGGTCCGAT'
+  assert minimum_skew(text) == minimum_skew(text, backend='python') == [11, 24]
+  assert list(gc_skew_iter('GAGCCACCGCGATA')) == [0,1,1,2,1,0,0,-1,-2,-1,-2,-1,-1,-1,-1]
+
+def test_pattern_match_approx_backends():
+  text = 'CGCCCGAATCCAGAACGCATTCCCATATTTCGGGACCACTGGCCTCCACGGTACGGACGTCAATCAAAT'
+  for (pattern, d) in [('ATTCTGGA',3), ('CCA',1), ('CCA',0), ('',0), (text+'A',5)]:
+    assert pattern_match_approx(text, pattern, d) == pattern_match_approx(text, pattern, d, backend='python')
+    assert pattern_count_approx(text, pattern, d) == pattern_count_approx(text, pattern, d, backend='python')
+  #non-ACGT characters count as mismatches in both backends
+  for text in ['ACGTNACGT', 'ACGTACGT\nACGTNNACG\n']:
+    for (pattern, d) in [('ACG', 1), ('ACG', 0), ('GTAC', 2)]:
+      assert pattern_match_approx(text, pattern, d) == pattern_match_approx(text, pattern, d, backend='python')
+      assert pattern_count_approx(text, pattern, d) == pattern_count_approx(text, pattern, d, backend='python')
+
+def test_parallel_search_stats(caplog):
+  texts = ['CGCCCCTCTCGGGGGTGTTCAGTAAACGGCCA', 'GGGCGAGGTATGTGTAAGTGCCAAGGTGCCAG', 'TAGTACCGAGACCGAAAGAAGTATACAGGCGT']
+  with caplog.at_level(logging.INFO):
+    randomized_motif_search(texts, 6, iterations=4, workers=2, seed=1)
+    gibbs_sampling_motif_search(texts, 6, 20, chains=2, workers=2, seed=1)
+  lines = [r.getMessage() for r in caplog.records]
+  assert sum('randomized_motif_search worker' in l for l in lines) == 2
+  assert sum('gibbs_sampling_motif_search worker' in l for l in lines) == 2
+
+def test_fm_index_inputs():
+  text = 'CGCCCGAATCCAGAACGCATTCCCATATTTCGGGACCACTGGCCTCCACGGTACGGACGTCAATCAAAT'
+  index = FMIndex.build(text)
+  assert pattern_match(index, 'CCA') == pattern_match(text, 'CCA')
+  assert pattern_count_approx(index, 'ATTCTGGA', 3) == pattern_count_approx(text, 'ATTCTGGA', 3) == 4
+
+def test_neighbors_backends():
+  for pattern in ['A', 'AAT', 'ACGT', 'GATTACA']:
+    for d in range(4):
+      assert neighbors_lt(pattern, d) == neighbors_lt(pattern, d, backend='python')
+
+def test_frequent_words_with_mismatches_backends():
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  for (k,d) in [(2,1),(4,1),(5,2),(6,0)]:
+    fast, fast_count = frequent_words_with_mismatches(text, k, d)
+    slow, slow_count = frequent_words_with_mismatches(text, k, d, backend='python')
+    assert sorted(fast) == sorted(slow) and fast_count == slow_count
+    fast = frequent_words_with_mismatches_complements(text, k, d, debug=True)
+    slow = frequent_words_with_mismatches_complements(text, k, d, debug=True, backend='python')
+    assert sorted(fast[0]) == sorted(slow[0]) and fast[1] == slow[1]
+
+def test_canonical_freq_map():
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  for k in [1,4,7]:
+    expected = canonicalize_freq_map(freq_map_kmers(text, k))
+    assert freq_map_kmers(text, k, canonical=True) == expected
+    assert freq_map_kmers(text, k, backend='python', canonical=True) == expected
+  assert canonicalize_freq_map({'AAC': 2, 'GTT': 3, 'ACGT': 1}) == {'AAC': 5, 'ACGT': 1}
+
 def test_hamming_distance():
   assert hamming_distance('ACT','AGT') == 1
   assert hamming_distance('ACT','AG') == 2
   assert hamming_distance('ACGT','ACG') == 1
   assert hamming_distance('ACT','CAT') == 2
+  assert hamming_distance(PackedGenome.from_str('ACT'), 'AG') == 2
+
+def test_packed_genome_inputs():
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  genome = PackedGenome.from_str(text)
+  assert sorted(frequent_words(genome, 4)) == ['CATG', 'GCAT']
+  assert pattern_match(genome, 'CATG') == pattern_match(text, 'CATG') == [6, 13, 20]
+  assert pattern_match_approx(genome, 'CATG', 1) == pattern_match_approx(text, 'CATG', 1)
+  assert minimum_skew(genome) == minimum_skew(text)
+  assert str(reverse_complement(genome)) == reverse_complement(text)
 
 def test_motif_score():
   counts = np.array([
@@ -536,12 +621,23 @@ def test_motif_score():
   ])
   assert(score_motif_counts(counts) == 0)
 
+
+def test_score_motif_profile_entropy():
+  motifs = ['TCGGGGGTTTTT', 'CCGGTGACTTAC', 'ACGGGGATTTTC', 'TTGGGGACTTTT', 'AAGGGGACTTCC',
+            'TTGGGGACTTCC', 'TCGGGGATTCAT', 'TCGGGGATTCCT', 'TAGGGGAACTAC', 'TCGGGTATAACC']
+  profile = profile_motif_matrix(np.array([list(m) for m in motifs])).values
+  before = profile.copy()
+  assert abs(score_motif_profile_entropy(profile) - 9.916290005356972) < 1e-9
+  assert (profile == before).all()
+  assert np.allclose(score_motif_profile_entropy(np.stack([profile, profile])), 9.916290005356972)
          
 def test_motif_enumerate():
   assert(
     sorted(motif_enumerate_bruteforce(['ATTTGGC','TGCCTTA','CGGTATC', 'GAAAATT'],k=3,d=1)) ==
     ['ATA','ATT','GTT','TTT']
   )
+  texts = ['TTCAGACCATTAATACAGGGCGCCA','GTTGAACTGACAACATGTTCGACTA','GACCGTGCCGCAAAAGGGGGTCCTG','ATTCCTAATAAGCCTCAAGAGCGAA']
+  assert motif_enumerate(texts, k=5, d=2) == sorted(motif_enumerate_bruteforce(texts, k=5, d=2))
 
 def test_median_string():
   soln = median_strings(['AAATTGACGCAT','GACGACCACGTT','CGTCAGCGCCTG','GCTGAGCACCGG','AGTTCGGGACAG'], k=3)
@@ -559,6 +655,11 @@ def test_median_string():
   soln = median_strings(['ATTTGGC','TGCCTTA','CGGTATC', 'GAAAATT'], k=3)
   assert (soln == ['ATT'])
 
+  texts = ['CTCGATGAGTAGGAAAGTAGTTTCACTGGGCGAACCACCCCGGCGCTAATCCTAGTGCCC', 'GCAATCCTACCCGAGGCCACATATCAGTAGGAACTAGAACCACCACGGGTGGCTAGTTTC',
+           'GGTGTTGAACCACGGGGTTAGTTTCATCTATTGTAGGAATCGGCTTCAAATCCTACACAG']
+  for k in [4, 6]:
+    assert median_strings(texts, k) == median_strings(texts, k, backend='python')
+
 def test_profile_most_probable_kmer():
   text = 'ACCTGTTTATTGCCTAAGTTCCGAACAAACCCAATATAGCCCGAGGGCCT'
   k = 5
@@ -603,6 +704,15 @@ def test_motif_search():
   gibbs = gibbs_sampling_motif_search(*input, iters=500)
   print(f"\tGibbs sampling soln after 500 iters: {gibbs}")
 
+def test_randomized_motif_search_batched():
+  texts = ['CGCCCCTCTCGGGGGTGTTCAGTAAACGGCCA', 'GGGCGAGGTATGTGTAAGTGCCAAGGTGCCAG',
+           'TAGTACCGAGACCGAAAGAAGTATACAGGCGT', 'TAGATCAAGTTTCAGGTGCACGTCGGTGAACC',
+           'AATCCACCAGCTCCACGTGCAATGTTGGCCTA']
+  random.seed(0)
+  serial = randomized_motif_search(texts, 8, iterations=100)
+  random.seed(0)
+  assert randomized_motif_search(texts, 8, iterations=100, batch_size=32) == serial
+
 def test_weighted_die():
   num_rolls = 100000
   wts = [1,1,1,10]
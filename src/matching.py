@@ -0,0 +1,153 @@
+"""Pattern matching over base-code arrays."""
+from collections import deque
+import sys
+from typing import Iterable
+
+import numpy as np
+import pytest
+
+import constants
+from packed import PackedGenome, as_codes
+
+_SCAN_CODES = np.full(256, len(constants.BASES), dtype=np.uint8) #non-ACGT bytes get their own symbol
+for _code, _base in enumerate(constants.BASES):
+  _SCAN_CODES[ord(_base)] = _code
+  _SCAN_CODES[ord(_base.lower())] = _code
+
+def scan_codes(text: 'str|PackedGenome|np.ndarray') -> np.ndarray:
+  """Base codes of text, with any other character of a string (N, line breaks) coded as a fifth symbol"""
+  if isinstance(text, str):
+    return _SCAN_CODES[np.frombuffer(text.encode('ascii'), dtype=np.uint8)]
+  return as_codes(text)
+
+def approx_match_positions(text: 'str|PackedGenome|np.ndarray', pattern: 'str|PackedGenome|np.ndarray', d: int) -> np.ndarray:
+  """Start positions of all windows of text within Hamming distance d of pattern.
+  Mismatches are accumulated for all windows at once, one vectorized pass per pattern position,
+  so the cost is m passes over the text instead of n*m Python operations.
+  Characters other than bases in a string text count as mismatches, at their own positions.
+  """
+  codes, pcodes = scan_codes(text), scan_codes(pattern)
+  m = len(pcodes)
+  n = len(codes) - m + 1
+  if n <= 0:
+    return np.zeros(0, dtype=np.intp)
+  mismatches = np.zeros(n, dtype=np.int32)
+  for j in range(m):
+    mismatches += codes[j:j+n] != pcodes[j]
+  return np.flatnonzero(mismatches <= d)
+
+class MultiPatternMatcher:
+  """Aho-Corasick automaton finding every occurrence of many patterns in one pass over a text.
+  The automaton is a dense (states x 5) int32 transition table over the base codes plus one symbol for
+  any other character (which always returns to the root), and pattern outputs are stored CSR-style:
+  the ids of the patterns ending at state s are out_ids[out_offsets[s]:out_offsets[s+1]].
+  """
+  def __init__(self, patterns: Iterable[str]):
+    self.patterns = list(dict.fromkeys(patterns)) #dedupe, keeping order
+    if any(len(p) == 0 for p in self.patterns):
+      raise ValueError("patterns must be non-empty")
+    nsym = len(constants.BASES) + 1
+    #trie, as lists while it grows
+    goto = [[-1] * nsym]
+    ends = [[]]
+    for pid, pattern in enumerate(self.patterns):
+      state = 0
+      for c in as_codes(pattern).tolist():
+        if goto[state][c] == -1:
+          goto[state][c] = len(goto)
+          goto.append([-1] * nsym)
+          ends.append([])
+        state = goto[state][c]
+      ends[state].append(pid)
+    #BFS from the root fills in fail links, turning the trie into a DFA, and merges outputs along fail links
+    fail = [0] * len(goto)
+    outputs = [list(e) for e in ends]
+    queue = deque()
+    for c in range(nsym):
+      if goto[0][c] == -1:
+        goto[0][c] = 0
+      else:
+        queue.append(goto[0][c])
+    goto[0][nsym-1] = 0
+    while queue:
+      state = queue.popleft()
+      outputs[state].extend(outputs[fail[state]])
+      for c in range(nsym):
+        nxt = goto[state][c]
+        if c == nsym-1:
+          goto[state][c] = 0
+        elif nxt == -1:
+          goto[state][c] = goto[fail[state]][c]
+        else:
+          fail[nxt] = goto[fail[state]][c]
+          queue.append(nxt)
+    self.delta = np.array(goto, dtype=np.int32)
+    self.out_offsets = np.zeros(len(outputs) + 1, dtype=np.int64)
+    np.cumsum([len(o) for o in outputs], out=self.out_offsets[1:])
+    self.out_ids = np.array([pid for o in outputs for pid in o], dtype=np.int32)
+    self.lengths = np.array([len(p) for p in self.patterns], dtype=np.int64)
+
+  @property
+  def num_states(self) -> int:
+    return self.delta.shape[0]
+
+  def matches(self, text: 'str|PackedGenome|np.ndarray') -> tuple[np.ndarray, np.ndarray]:
+    """All matches as parallel arrays of (pattern id, start position), ordered by end position"""
+    nsym = self.delta.shape[1]
+    delta = self.delta.ravel().tolist() #plain list indexing is much faster than ndarray scalar indexing
+    has_output = (np.diff(self.out_offsets) > 0).tolist()
+    hit_ends, hit_states = [], []
+    state = 0
+    for i, c in enumerate(scan_codes(text).tolist()):
+      state = delta[state * nsym + c]
+      if has_output[state]:
+        hit_ends.append(i)
+        hit_states.append(state)
+    if not hit_ends:
+      return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+    hit_states = np.array(hit_states)
+    counts = self.out_offsets[hit_states + 1] - self.out_offsets[hit_states]
+    #expand each hit into one row per pattern ending there
+    firsts = np.repeat(self.out_offsets[hit_states] - np.cumsum(counts) + counts, counts)
+    pids = self.out_ids[firsts + np.arange(counts.sum())]
+    starts = np.repeat(np.array(hit_ends), counts) - self.lengths[pids] + 1
+    return pids, starts
+
+  def find_all(self, text: 'str|PackedGenome|np.ndarray') -> dict[str, list[int]]:
+    """Sorted start positions of every pattern in text"""
+    pids, starts = self.matches(text)
+    order = np.lexsort((starts, pids))
+    pids, starts = pids[order], starts[order]
+    bounds = np.searchsorted(pids, np.arange(len(self.patterns) + 1))
+    return {p: starts[bounds[i]:bounds[i+1]].tolist() for i, p in enumerate(self.patterns)}
+
+  def count_all(self, text: 'str|PackedGenome|np.ndarray') -> dict[str, int]:
+    pids, _ = self.matches(text)
+    return dict(zip(self.patterns, np.bincount(pids, minlength=len(self.patterns)).tolist()))
+
+## TESTS
+def test_approx_match_positions():
+  text = 'CGCCCGAATCCAGAACGCATTCCCATATTTCGGGACCACTGGCCTCCACGGTACGGACGTCAATCAAAT'
+  assert approx_match_positions(text, 'ATTCTGGA', 3).tolist() == [6, 7, 26, 27]
+  assert len(approx_match_positions('AACAAGCTGATAAACATTTAAAGAG', 'AAAAA', 2)) == 11
+  assert approx_match_positions(PackedGenome.from_str('GCGCG'), 'GCG', 0).tolist() == [0, 2]
+  assert approx_match_positions('ACG', 'ACGT', 4).tolist() == []
+  #N and line breaks are mismatches, and positions are those of the raw string
+  assert approx_match_positions('ACGTNACGT\n', 'ACG', 1).tolist() == [0, 5]
+  assert approx_match_positions('ACGTNACGT\n', 'CGT', 1).tolist() == [1, 6]
+
+def test_multi_pattern_matcher():
+  matcher = MultiPatternMatcher(['ATAT', 'TA', 'GCAT', 'ATATA', 'TA', 'CC'])
+  text = 'GATATATGCATATACTT'
+  assert matcher.find_all(text) == {
+    'ATAT': [1, 3, 9], 'TA': [2, 4, 10, 12], 'GCAT': [7], 'ATATA': [1, 9], 'CC': []
+  }
+  assert matcher.count_all(text) == {'ATAT': 3, 'TA': 4, 'GCAT': 1, 'ATATA': 2, 'CC': 0}
+  assert matcher.find_all(PackedGenome.from_str(text)) == matcher.find_all(text)
+  #other characters break matches instead of raising
+  assert matcher.find_all('ATNAT\nATAT')['ATAT'] == [6]
+  with pytest.raises(ValueError):
+    MultiPatternMatcher(['A', ''])
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
@@ -0,0 +1,412 @@
+"""Motif search primitives on plain ndarrays.
+
+Profiles are 4 x k arrays with rows in the order of constants.BASES, and texts are base-code
+arrays (see packed.py), so a window's probability is a fancy-indexed lookup per column.
+A collection of t motifs is a t x k uint8 matrix of base codes.
+"""
+from fractions import Fraction
+import math
+import random
+import sys
+from typing import Iterable
+
+import numpy as np
+import pytest
+
+from kmers import code_mismatches, decode_kmers, kmer_codes
+from neighbors import mismatch_masks
+from packed import as_codes, decode
+
+_BASE_CODES = np.arange(4, dtype=np.uint8)
+DISTANCE_BLOCK = 1 << 22 #candidate x window distances computed at once by median_string_codes
+SEED_CANDIDATES = 64 #windows hill-climbed to get the initial bound of median_string_codes
+OBJECTIVES = ('counts', 'entropy')
+TIE_TOLERANCE = 1e-9 #log-probabilities this close to the max count as tied (equal products can differ by an ulp as log sums)
+
+def encode_motifs(motifs: 'Iterable[str]|np.ndarray') -> np.ndarray:
+  """A t x k code matrix from k-mer strings or a t x k array of characters"""
+  if isinstance(motifs, np.ndarray) and motifs.dtype.kind == 'u':
+    return motifs
+  rows = [''.join(row) for row in motifs]
+  return np.array([as_codes(row) for row in rows], dtype=np.uint8).reshape(len(rows), -1)
+
+def decode_motifs(motif_codes: np.ndarray) -> list[str]:
+  return [decode(row) for row in motif_codes]
+
+def count_matrix(motif_codes: np.ndarray, pseudo_counts=False) -> np.ndarray:
+  """4 x k counts of each base at each position, plus 1 everywhere with pseudo_counts"""
+  counts = (motif_codes[None, :, :] == _BASE_CODES[:, None, None]).sum(axis=1)
+  return counts + 1 if pseudo_counts else counts
+
+def profile_matrix(motif_codes: np.ndarray, pseudo_counts=False) -> np.ndarray:
+  counts = count_matrix(motif_codes, pseudo_counts)
+  return counts / counts.sum(axis=0)
+
+def score_counts(counts: np.ndarray) -> int:
+  """Number of motif entries that differ from the most common base in their column"""
+  return int((counts.sum(axis=0) - counts.max(axis=0)).sum())
+
+def profile_entropy(profiles: np.ndarray) -> 'float|np.ndarray':
+  """Entropy in bits summed over the columns of each 4 x k profile in a (..., 4, k) array, with 0 log 0 = 0.
+  The input is not modified."""
+  p = np.asarray(profiles, dtype=float)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    terms = np.where(p > 0, -p * np.log2(p), 0.0)
+  total = terms.sum(axis=(-2, -1))
+  return float(total) if total.ndim == 0 else total
+
+def objective_scores(counts: np.ndarray, objective='counts') -> 'int|float|np.ndarray':
+  """Score of each count matrix in a (..., 4, k) array, lower is better: the number of entries off the
+  consensus for 'counts', the entropy of the motifs' profile for 'entropy'"""
+  if objective == 'counts':
+    scores = (counts.sum(axis=-2) - counts.max(axis=-2)).sum(axis=-1)
+    return int(scores) if np.ndim(scores) == 0 else scores
+  if objective == 'entropy':
+    return profile_entropy(counts / counts.sum(axis=-2, keepdims=True))
+  raise ValueError(f"unknown objective {objective!r}, expected one of {OBJECTIVES}")
+
+def window_matrix(codes: np.ndarray, starts: 'Iterable[int]', k: int) -> np.ndarray:
+  """Motif matrix of the k-windows at starts[i] of each code array codes[i]"""
+  return np.array([text[s:s+k] for text, s in zip(codes, starts)], dtype=np.uint8).reshape(-1, k)
+
+def log_profile(profile: np.ndarray) -> np.ndarray:
+  """Elementwise natural log of a profile, with log(0) = -inf"""
+  with np.errstate(divide='ignore'):
+    return np.log(np.asarray(profile, dtype=float))
+
+def window_log_probs(codes: np.ndarray, log_prof: np.ndarray) -> np.ndarray:
+  """Log-probability of every k-window of codes under a 4 x k log-profile"""
+  k = log_prof.shape[1]
+  n = len(codes) - k + 1
+  if n <= 0:
+    return np.zeros(0)
+  scores = np.zeros(n)
+  for j in range(k):
+    scores += log_prof[codes[j:j+n], j]
+  return scores
+
+def window_probs(codes: np.ndarray, log_prof: np.ndarray) -> np.ndarray:
+  """Probabilities of every window normalized to sum to 1, i.e. the Gibbs sampling distribution.
+  Falls back to uniform when every window has probability 0."""
+  scores = window_log_probs(codes, log_prof)
+  best = scores.max()
+  if best == -np.inf:
+    return np.full(len(scores), 1 / len(scores))
+  weights = np.exp(scores - best)
+  return weights / weights.sum()
+
+def first_max(scores: np.ndarray, axis: int = -1) -> np.ndarray:
+  """Index of the first score within TIE_TOLERANCE of the max along axis, so exact ties in probability
+  go to the first window even when their log sums round differently"""
+  best = scores.max(axis=axis, keepdims=True)
+  return (scores >= best - TIE_TOLERANCE).argmax(axis=axis)
+
+def most_probable_window(codes: np.ndarray, log_prof: np.ndarray) -> int:
+  """Start of the most probable window, the first one on ties"""
+  return int(first_max(window_log_probs(codes, log_prof)))
+
+def random_motifs(codes: list[np.ndarray], k: int, rng: random.Random = random) -> np.ndarray:
+  return window_matrix(codes, [rng.randint(0, len(c)-k) for c in codes], k)
+
+def improve_motifs(codes: list[np.ndarray], motifs: np.ndarray, pseudo_counts=True, objective='counts') -> tuple[np.ndarray, 'int|float']:
+  """Replace motifs by the most probable windows under their own profile until the score stops improving"""
+  k = motifs.shape[1]
+  score = objective_scores(count_matrix(motifs), objective)
+  while True:
+    log_prof = log_profile(profile_matrix(motifs, pseudo_counts))
+    new_motifs = window_matrix(codes, [most_probable_window(c, log_prof) for c in codes], k)
+    new_score = objective_scores(count_matrix(new_motifs), objective)
+    if new_score >= score:
+      return motifs, score
+    motifs, score = new_motifs, new_score
+
+def batch_counts(motifs: np.ndarray, pseudo_counts=False) -> np.ndarray:
+  """R x 4 x k count matrices of an R x t x k batch of motif matrices"""
+  counts = (motifs[:, None, :, :] == _BASE_CODES[None, :, None, None]).sum(axis=2)
+  return counts + 1 if pseudo_counts else counts
+
+def improve_motifs_batched(windows: np.ndarray, starts: np.ndarray, pseudo_counts=True, objective='counts') -> tuple[np.ndarray, np.ndarray]:
+  """improve_motifs for R restarts at once.
+  windows is the t x m x k array of every window of t equal-length texts and starts an R x t array of window starts.
+  Profiles are R x 4 x k and every window of every text is scored for all R restarts with one lookup per column.
+  Restarts drop out of the batch once their score stops improving. Returns the final R x t starts and R scores."""
+  t, m, k = windows.shape
+  seqs = np.arange(t)
+  starts = starts.copy()
+  scores = objective_scores(batch_counts(windows[seqs, starts]), objective)
+  active = np.arange(len(starts))
+  while len(active):
+    counts = batch_counts(windows[seqs, starts[active]], pseudo_counts)
+    log_prof = log_profile(counts / counts.sum(axis=1, keepdims=True))
+    window_scores = np.zeros((len(active), t, m))
+    for j in range(k):
+      window_scores += log_prof[:, :, j][:, windows[:, :, j]]
+    new_starts = first_max(window_scores, axis=2)
+    new_scores = objective_scores(batch_counts(windows[seqs, new_starts]), objective)
+    improved = new_scores < scores[active]
+    active = active[improved]
+    starts[active] = new_starts[improved]
+    scores[active] = new_scores[improved]
+  return starts, scores
+
+def randomized_search(codes: list[np.ndarray], k: int, restarts: int, pseudo_counts=True, rng: random.Random = random, batch_size=1, objective='counts') -> tuple[np.ndarray, 'int|float']:
+  """Best of restarts runs of randomized motif search.
+  With batch_size > 1 and equal-length texts, restarts run batch_size at a time (see improve_motifs_batched),
+  drawing the same starts and so finding the same motifs as running them one by one."""
+  if batch_size > 1 and len({len(c) for c in codes}) == 1:
+    windows = np.lib.stride_tricks.sliding_window_view(np.stack(codes), k, axis=1)
+    best_starts, best_score = None, float('inf')
+    for done in range(0, restarts, batch_size):
+      starts = np.array([[rng.randint(0, len(c)-k) for c in codes] for _ in range(min(batch_size, restarts - done))]).reshape(-1, len(codes))
+      starts, scores = improve_motifs_batched(windows, starts, pseudo_counts, objective)
+      if scores.min() < best_score:
+        best_starts, best_score = starts[scores.argmin()], scores.min().item()
+    return window_matrix(codes, best_starts, k), best_score
+  best_motifs, best_score = None, float('inf')
+  for _ in range(restarts):
+    motifs, score = improve_motifs(codes, random_motifs(codes, k, rng), pseudo_counts, objective)
+    if score < best_score:
+      best_motifs, best_score = motifs, score
+  return best_motifs, best_score
+
+def greedy_search_batched(codes: list[np.ndarray], k: int, pseudo_counts=False, objective='counts') -> tuple[np.ndarray, 'int|float']:
+  """Greedy motif search with every window of the first text as a seed at once.
+  The S seeds' profiles are S x 4 x k counts that gain one row per text, and each text's windows are scored
+  for all seeds with one lookup per column. Ties go to the first window and to the first seed, as in the serial search."""
+  windows = [np.lib.stride_tricks.sliding_window_view(c, k) for c in codes]
+  seeds = np.arange(len(windows[0]))
+  motifs = np.empty((len(seeds), len(codes), k), dtype=np.uint8)
+  motifs[:, 0] = windows[0]
+  counts = batch_counts(motifs[:, :1])
+  for j in range(1, len(codes)):
+    profile = counts + 1 if pseudo_counts else counts
+    log_prof = log_profile(profile / profile.sum(axis=1, keepdims=True))
+    window_scores = np.zeros((len(seeds), len(windows[j])))
+    for c in range(k):
+      window_scores += log_prof[:, :, c][:, windows[j][:, c]]
+    motifs[:, j] = windows[j][first_max(window_scores, axis=1)]
+    counts += motifs[:, j, None, :] == _BASE_CODES[None, :, None]
+  scores = objective_scores(counts, objective)
+  best = int(scores.argmin())
+  return motifs[best], scores[best].item()
+
+class GibbsState:
+  """Motifs of a Gibbs sampler with a running count matrix, so swapping one motif is an O(k) update"""
+  def __init__(self, codes: list[np.ndarray], k: int, starts: 'Iterable[int]', pseudo_counts=True, objective='counts'):
+    self.codes = codes
+    self.k = k
+    self.pseudo_counts = pseudo_counts
+    self.objective = objective
+    self.motifs = window_matrix(codes, starts, k)
+    self.counts = count_matrix(self.motifs)
+    self._cols = np.arange(k)
+
+  def remove(self, i: int) -> None:
+    self.counts[self.motifs[i], self._cols] -= 1
+
+  def add(self, i: int, start: int) -> None:
+    self.motifs[i] = self.codes[i][start:start+self.k]
+    self.counts[self.motifs[i], self._cols] += 1
+
+  def score(self) -> 'int|float':
+    return objective_scores(self.counts, self.objective)
+
+  def window_probs(self, i: int) -> np.ndarray:
+    """Sampling distribution over the windows of sequence i, which must have been removed"""
+    counts = self.counts + 1 if self.pseudo_counts else self.counts
+    return window_probs(self.codes[i], log_profile(counts / counts[:, 0].sum()))
+
+def gibbs_sample(codes: list[np.ndarray], k: int, iters: int, pseudo_counts=True, rng: random.Random = random, objective='counts') -> tuple[np.ndarray, 'int|float']:
+  """Gibbs sampling motif search, returning the best motif matrix seen and its score.
+  Draws from rng in the same order as random.randint starts followed by randint/choices per iteration."""
+  t = len(codes)
+  state = GibbsState(codes, k, [rng.randint(0, len(c)-k) for c in codes], pseudo_counts, objective)
+  best_motifs, best_score = state.motifs.copy(), state.score()
+  for _ in range(iters):
+    i = rng.randint(0, t-1)
+    state.remove(i)
+    cum_probs = np.cumsum(state.window_probs(i))
+    #the same draw as random.choices(weights=probs)
+    start = min(int(np.searchsorted(cum_probs, rng.random() * cum_probs[-1], side='right')), len(cum_probs)-1)
+    state.add(i, start)
+    score = state.score()
+    if score < best_score:
+      best_motifs, best_score = state.motifs.copy(), score
+  return best_motifs, best_score
+
+def _window_table(window_codes: list[np.ndarray]) -> np.ndarray:
+  """Distinct codes of each text as rows of a t x M table, short rows padded by repeating their first code"""
+  uniq = [np.unique(w) for w in window_codes]
+  table = np.empty((len(uniq), max(len(u) for u in uniq)), dtype=np.uint64)
+  for row, u in zip(table, uniq):
+    row[:] = u[0]
+    row[:len(u)] = u
+  return table
+
+def motif_distances(candidates: np.ndarray, table: np.ndarray) -> np.ndarray:
+  """d(candidate, texts) for each candidate code: the sum over texts of the closest window, by XOR/popcount"""
+  distances = np.empty(len(candidates), dtype=np.int64)
+  block = max(1, DISTANCE_BLOCK // table.size)
+  for start in range(0, len(candidates), block):
+    chunk = candidates[start:start+block, None, None]
+    distances[start:start+block] = code_mismatches(chunk, table[None]).min(axis=2).sum(axis=1)
+  return distances
+
+def _upper_bound(table: np.ndarray, k: int) -> int:
+  """The distance of a good k-mer: the closest windows of the texts, improved one substitution at a time"""
+  candidates = np.unique(table)
+  distances = motif_distances(candidates, table)
+  order = np.argsort(distances, kind='stable')[:SEED_CANDIDATES]
+  candidates, distances = candidates[order], distances[order]
+  masks = mismatch_masks(k, 1)
+  while True:
+    nbrs = np.unique((candidates[:, None] ^ masks[None, :]).ravel())
+    nbr_distances = motif_distances(nbrs, table)
+    if nbr_distances.min() >= distances.min():
+      return int(distances.min())
+    order = np.argsort(nbr_distances, kind='stable')[:SEED_CANDIDATES]
+    candidates, distances = nbrs[order], nbr_distances[order]
+
+def median_string_codes(codes: list[np.ndarray], k: int) -> tuple[np.ndarray, int]:
+  """Codes (sorted) of every k-mer minimizing d(pattern, texts), and that minimum distance.
+  Branch-and-bound over the tree of prefixes: the distance of a p-base prefix to the p-base prefixes of the
+  windows never exceeds the distance of any of its extensions, so prefixes whose bound exceeds the best distance
+  seen are cut along with their subtrees. The best distance starts from hill-climbing the closest windows of
+  the texts, and each level of the tree is expanded and bounded as one array."""
+  windows = [kmer_codes(c, k) for c in codes]
+  if any(len(w) == 0 for w in windows):
+    raise ValueError(f"every text must be at least k={k} long")
+  table = _window_table(windows)
+  best = _upper_bound(table, k)
+  frontier = np.zeros(1, dtype=np.uint64)
+  for p in range(1, k+1):
+    children = ((frontier[:, None] << np.uint64(2)) | _BASE_CODES.astype(np.uint64)[None, :]).ravel()
+    bounds = motif_distances(children, _window_table([w >> np.uint64(2*(k-p)) for w in windows]))
+    frontier = children[bounds <= best]
+  distances = motif_distances(frontier, table)
+  best = int(distances.min())
+  return frontier[distances == best], best
+
+## TESTS
+def test_motif_core():
+  motif_codes = encode_motifs(['TCGGGGGTTTTT', 'CCGGTGACTTAC', 'ACGGGGATTTTC', 'TTGGGGACTTTT', 'AAGGGGACTTCC',
+                               'TTGGGGACTTCC', 'TCGGGGATTCAT', 'TCGGGGATTCCT', 'TAGGGGAACTAC', 'TCGGGTATAACC'])
+  assert motif_codes.shape == (10, 12)
+  assert (encode_motifs(np.array([list('ACG'), list('TTA')])) == [[0, 1, 2], [3, 3, 0]]).all()
+  counts = count_matrix(motif_codes)
+  assert counts[:, 0].tolist() == [2, 1, 0, 7]
+  assert (count_matrix(motif_codes, pseudo_counts=True) == counts + 1).all()
+  assert score_counts(counts) == 30
+  assert np.allclose(profile_matrix(motif_codes)[:, 0], [0.2, 0.1, 0.0, 0.7])
+  assert decode_motifs(window_matrix([as_codes('GATTACA'), as_codes('TTTT')], [2, 1], 2)) == ['TT', 'TT']
+
+def test_objective_scores():
+  profile = np.array([[0.2, 0.0], [0.1, 1.0], [0.0, 0.0], [0.7, 0.0]])
+  before = profile.copy()
+  assert np.isclose(profile_entropy(profile), -(0.2*np.log2(0.2) + 0.1*np.log2(0.1) + 0.7*np.log2(0.7)))
+  assert (profile == before).all()
+  batch = np.stack([profile, np.full((4, 2), 0.25)])
+  assert np.allclose(profile_entropy(batch), [profile_entropy(profile), 4.0])
+  counts = count_matrix(encode_motifs(['ACG', 'ACT', 'TCT']))
+  assert objective_scores(counts) == score_counts(counts) == 2
+  assert np.isclose(objective_scores(counts, 'entropy'), profile_entropy(counts / 3))
+  assert objective_scores(np.stack([counts, counts]), 'counts').tolist() == [2, 2]
+  with pytest.raises(ValueError):
+    objective_scores(counts, 'bits')
+
+def test_randomized_search_batched():
+  codes = [as_codes(text) for text in ['CGCCCCTCTCGGGGGTGTTCAGTAAACGGCCA', 'GGGCGAGGTATGTGTAAGTGCCAAGGTGCCAG',
+                                       'TAGTACCGAGACCGAAAGAAGTATACAGGCGT', 'TAGATCAAGTTTCAGGTGCACGTCGGTGAACC',
+                                       'AATCCACCAGCTCCACGTGCAATGTTGGCCTA']]
+  serial = randomized_search(codes, 8, 50, rng=random.Random(2))
+  for batch_size in [7, 50]:
+    batched = randomized_search(codes, 8, 50, rng=random.Random(2), batch_size=batch_size)
+    assert batched[1] == serial[1] and (batched[0] == serial[0]).all()
+  windows = np.lib.stride_tricks.sliding_window_view(np.stack(codes), 8, axis=1)
+  starts, scores = improve_motifs_batched(windows, np.zeros((3, 5), dtype=int))
+  assert (scores == improve_motifs(codes, window_matrix(codes, [0]*5, 8))[1]).all()
+  serial = randomized_search(codes, 8, 20, rng=random.Random(4), objective='entropy')
+  batched = randomized_search(codes, 8, 20, rng=random.Random(4), batch_size=8, objective='entropy')
+  assert np.isclose(batched[1], serial[1]) and np.isclose(serial[1], objective_scores(count_matrix(serial[0]), 'entropy'))
+  #equal-probability windows whose log sums round differently still go to the first one, as in the serial search
+  codes = [as_codes(text) for text in ['GATAAAGCAAGA', 'CTGTGAAAATAT', 'CCATCAGGCGGT', 'CCTCCCGACGTG', 'GGCGGGAAACCC']]
+  serial = randomized_search(codes, 3, 20, rng=random.Random(25))
+  batched = randomized_search(codes, 3, 20, rng=random.Random(25), batch_size=20)
+  assert batched[1] == serial[1] and (batched[0] == serial[0]).all()
+
+def test_median_string_codes():
+  texts = ['AAATTGACGCAT', 'GACGACCACGTT', 'CGTCAGCGCCTG', 'GCTGAGCACCGG', 'AGTTCGGGACAG']
+  medians, distance = median_string_codes([as_codes(t) for t in texts], 3)
+  assert decode_kmers(medians, 3) == ['GAC']
+  assert distance == 2
+  #brute force over every 4-mer
+  texts = ['ATTTGGCA', 'TGCCTTAC', 'CGGTATCA', 'GAAAATTC']
+  all_codes = np.arange(4**4, dtype=np.uint64)
+  table = _window_table([kmer_codes(t, 4) for t in texts])
+  distances = motif_distances(all_codes, table)
+  medians, distance = median_string_codes([as_codes(t) for t in texts], 4)
+  assert medians.tolist() == all_codes[distances == distances.min()].tolist() and distance == distances.min()
+
+def test_greedy_search_batched():
+  texts = ['GGCGTTCAGGCA', 'AAGAATCAGTCA', 'CAAGGAGTTCGC', 'CACGTCAATCAC', 'CAATAATATTCG']
+  motifs, score = greedy_search_batched([as_codes(t) for t in texts], 3)
+  assert decode_motifs(motifs) == ['CAG', 'CAG', 'CAA', 'CAA', 'CAA'] and score == 2
+  motifs, score = greedy_search_batched([as_codes(t) for t in texts], 3, pseudo_counts=True)
+  assert decode_motifs(motifs) == ['TTC', 'ATC', 'TTC', 'ATC', 'TTC']
+  #against greedy search in exact fractions, where equal probabilities are exactly tied
+  def exact_greedy(texts, k):
+    best, best_score = None, None
+    for i in range(len(texts[0]) - k + 1):
+      chosen = [texts[0][i:i+k]]
+      for text in texts[1:]:
+        profile = [{b: Fraction(sum(m[j] == b for m in chosen) + 1, len(chosen) + 4) for b in 'ACGT'} for j in range(k)]
+        windows = [text[s:s+k] for s in range(len(text) - k + 1)]
+        chosen.append(max(windows, key=lambda w: math.prod(profile[j][b] for j, b in enumerate(w))))
+      score = sum(len(chosen) - max(sum(m[j] == b for m in chosen) for b in 'ACGT') for j in range(k))
+      if best_score is None or score < best_score:
+        best, best_score = chosen, score
+    return best, best_score
+  texts = ['ATCGTGTGAGGGCATGCTTT', 'GGGTTGCTCTTATAGTCAAA', 'CCCCACTCAGCGCATTAGTC',
+           'TATTGTAGTGTTATCTCGGT', 'CGCTCATCATAAAATACGGC', 'GCGGGTTCCTGTCGCCAACG']
+  motifs, score = greedy_search_batched([as_codes(t) for t in texts], 5, pseudo_counts=True)
+  assert (decode_motifs(motifs), score) == exact_greedy(texts, 5) == (['ATCGT', 'ATAGT', 'TTAGT', 'ATTGT', 'ATCAT', 'TTCCT'], 7)
+
+def test_gibbs_state():
+  codes = [as_codes(text) for text in ['CGCCCCTCTCGGGGGTGTTCAGTAAACGGCCA', 'GGGCGAGGTATGTGTAAGTGCCAAGGTGCCAG',
+                                       'TAGTACCGAGACCGAAAGAAGTATACAGGCGT', 'TAGATCAAGTTTCAGGTGCACGTCGGTGAACC']]
+  state = GibbsState(codes, 8, [0, 1, 2, 3])
+  state.remove(2)
+  assert (state.counts == count_matrix(np.delete(state.motifs, 2, axis=0))).all()
+  assert np.isclose(state.window_probs(2).sum(), 1) and len(state.window_probs(2)) == 25
+  state.add(2, 10)
+  assert decode_motifs(state.motifs)[2] == 'ACCGAAAG'
+  assert (state.counts == count_matrix(state.motifs)).all()
+  best, score = gibbs_sample(codes, 8, 100, rng=random.Random(1))
+  assert score == score_counts(count_matrix(best))
+  assert (gibbs_sample(codes, 8, 100, rng=random.Random(1))[0] == best).all()
+
+def test_most_probable_window():
+  text = 'ACCTGTTTATTGCCTAAGTTCCGAACAAACCCAATATAGCCCGAGGGCCT'
+  profile = np.array([
+    [0.2,0.2,0.3,0.2,0.3],
+    [0.4,0.3,0.1,0.5,0.1],
+    [0.3,0.3,0.5,0.2,0.4],
+    [0.1,0.2,0.1,0.1,0.2],
+  ])
+  i = most_probable_window(as_codes(text), log_profile(profile))
+  assert text[i:i+5] == 'CCGAG'
+  #ties and all-zero profiles pick the first window
+  assert most_probable_window(as_codes('AAAA'), log_profile(np.full((4, 2), 0.25))) == 0
+  assert most_probable_window(as_codes('AAAA'), log_profile(np.zeros((4, 2)))) == 0
+  #TTG and GTC both have probability 1/8 * 5/8 * 1/2, but their log sums differ in the last bit
+  log_prof = log_profile(profile_matrix(encode_motifs(['GTG', 'CTG', 'GTG', 'GTA']), True))
+  scores = window_log_probs(as_codes('TTGTC'), log_prof)
+  assert scores[0] != scores[2] and most_probable_window(as_codes('TTGTC'), log_prof) == 0
+
+def test_window_probs():
+  profile = np.array([[0.5, 0.0], [0.5, 0.5], [0.0, 0.5], [0.0, 0.0]])
+  assert np.allclose(window_probs(as_codes('ACGA'), log_profile(profile)), [0.5, 0.5, 0.0])
+  assert np.allclose(window_probs(as_codes('TTT'), log_profile(profile)), [0.5, 0.5])
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
@@ -0,0 +1,176 @@
+"""d-neighborhoods of integer-coded k-mers (see kmers.py for the coding).
+
+XOR-ing one base of a k-mer code with 1, 2 or 3 turns it into each of the other three bases,
+so the d-neighborhood of every k-mer is the same set of XOR masks applied to its code.
+"""
+from functools import lru_cache
+import itertools
+import sys
+
+import numpy as np
+import pytest
+
+from kmers import DENSE_LIMIT, MAX_K, code_mismatches, decode_kmers, encode_kmer, kmer_codes, reverse_complement_codes, unique_codes
+from packed import PackedGenome
+
+NEIGHBOR_CACHE_SIZE = 1 << 16
+BLOCK_ENTRIES = 1 << 22 #neighbor codes materialized at once by mismatch_counts
+
+@lru_cache(maxsize=None)
+def mismatch_masks(k: int, d: int) -> np.ndarray:
+  """XOR masks for every substitution of at most d of the k bases (including the empty one)"""
+  if not 0 < k <= MAX_K:
+    raise ValueError(f"k must be between 1 and {MAX_K}, got {k}")
+  masks = [0]
+  for i in range(1, min(d, k) + 1):
+    for positions in itertools.combinations(range(k), i):
+      shifts = [2 * (k - 1 - p) for p in positions]
+      for values in itertools.product((1, 2, 3), repeat=i):
+        masks.append(sum(v << s for v, s in zip(values, shifts)))
+  masks = np.array(masks, dtype=np.uint64)
+  masks.flags.writeable = False
+  return masks
+
+def neighborhood_size(k: int, d: int) -> int:
+  return len(mismatch_masks(k, d))
+
+@lru_cache(maxsize=NEIGHBOR_CACHE_SIZE)
+def neighbor_codes(code: int, k: int, d: int) -> np.ndarray:
+  """Codes of all k-mers within Hamming distance d of code. Cached, so the result is read-only."""
+  nbrs = np.uint64(code) ^ mismatch_masks(k, d)
+  nbrs.flags.writeable = False
+  return nbrs
+
+def neighbor_codes_batch(codes: np.ndarray, k: int, d: int) -> np.ndarray:
+  """A (len(codes) x neighborhood size) array with the d-neighborhood of each code in a row"""
+  return np.asarray(codes, dtype=np.uint64)[:, None] ^ mismatch_masks(k, d)[None, :]
+
+def neighbors(pattern: str, d: int) -> set[str]:
+  k = len(pattern)
+  return set(decode_kmers(neighbor_codes(encode_kmer(pattern), k, d), k))
+
+def mismatch_counts(text: 'str|PackedGenome|np.ndarray', k: int, d: int, reverse_complements=False) -> np.ndarray:
+  """Dense 4^k table counting, for every k-mer, the windows of text within Hamming distance d of it.
+  Windows are processed in blocks whose neighbor codes are scattered into the table at once.
+  With reverse_complements, windows matching the k-mer's reverse complement are counted too,
+  which is the forward table read at the reverse-complement codes (no second pass over the text).
+  """
+  if 4**k > DENSE_LIMIT:
+    raise ValueError(f"a dense 4^{k} table is too large, need 4^k <= {DENSE_LIMIT}")
+  kcodes = kmer_codes(text, k)
+  masks = mismatch_masks(k, d)
+  counts = np.zeros(4**k, dtype=np.uint32)
+  block = max(1, BLOCK_ENTRIES // len(masks))
+  for start in range(0, len(kcodes), block):
+    nbrs = neighbor_codes_batch(kcodes[start:start+block], k, d).ravel()
+    if len(nbrs) >= 4**k // 8:
+      counts += np.bincount(nbrs.astype(np.intp), minlength=4**k).astype(np.uint32)
+    else:
+      uniq, ucounts = np.unique(nbrs, return_counts=True)
+      counts[uniq.astype(np.intp)] += ucounts.astype(np.uint32)
+  if reverse_complements:
+    #only k-mers with a nonzero forward count contribute, and reverse complementing is an involution
+    present = np.flatnonzero(counts)
+    rc = reverse_complement_codes(present.astype(np.uint64), k).astype(np.intp)
+    counts[rc] += counts[present] #rc codes are distinct, and the right side is read before any write
+  return counts
+
+def most_frequent_with_mismatches(text: 'str|PackedGenome|np.ndarray', k: int, d: int, reverse_complements=False) -> tuple[list[str], int]:
+  counts = mismatch_counts(text, k, d, reverse_complements)
+  max_count = int(counts.max())
+  if max_count == 0:
+    return [], 0
+  return decode_kmers(np.flatnonzero(counts == max_count), k), max_count
+
+def _neighborhood_bitmap(kcodes: np.ndarray, k: int, d: int) -> np.ndarray:
+  present = np.zeros(4**k, dtype=bool)
+  block = max(1, BLOCK_ENTRIES // neighborhood_size(k, d))
+  for start in range(0, len(kcodes), block):
+    present[neighbor_codes_batch(kcodes[start:start+block], k, d).ravel().astype(np.intp)] = True
+  return present
+
+def neighborhood_set(text: 'str|PackedGenome|np.ndarray', k: int, d: int) -> np.ndarray:
+  """Sorted distinct codes of every k-mer within Hamming distance d of some window of text"""
+  kcodes = unique_codes(kmer_codes(text, k))
+  if 4**k <= DENSE_LIMIT:
+    return np.flatnonzero(_neighborhood_bitmap(kcodes, k, d)).astype(np.uint64)
+  block = max(1, BLOCK_ENTRIES // neighborhood_size(k, d))
+  parts = [unique_codes(neighbor_codes_batch(kcodes[start:start+block], k, d)) for start in range(0, len(kcodes), block)]
+  return unique_codes(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.uint64)
+
+def within_distance(candidates: np.ndarray, text: 'str|PackedGenome|np.ndarray', k: int, d: int) -> np.ndarray:
+  """Mask of the candidate codes within Hamming distance d of some window of text"""
+  kcodes = unique_codes(kmer_codes(text, k))
+  keep = np.zeros(len(candidates), dtype=bool)
+  block = max(1, BLOCK_ENTRIES // max(len(kcodes), 1))
+  for start in range(0, len(candidates), block):
+    keep[start:start+block] = (code_mismatches(candidates[start:start+block, None], kcodes[None, :]) <= d).any(axis=1)
+  return keep
+
+def motif_enumeration_codes(texts: 'list[str|PackedGenome|np.ndarray]', k: int, d: int) -> np.ndarray:
+  """Sorted codes of the (k, d)-motifs of texts: k-mers within distance d of a window of every text.
+  The motifs of the first texts are the intersection of their neighborhood sets (looked up in a 4^k bitmap
+  when it is small enough). Once fewer motifs remain than one window's neighborhood, filtering them by
+  distance to the next text's windows is cheaper than building its neighborhood."""
+  common = None
+  for text in texts:
+    if common is not None and len(common) <= neighborhood_size(k, d):
+      common = common[within_distance(common, text, k, d)]
+    elif common is None:
+      common = neighborhood_set(text, k, d)
+    elif 4**k <= DENSE_LIMIT:
+      common = common[_neighborhood_bitmap(unique_codes(kmer_codes(text, k)), k, d)[common.astype(np.intp)]]
+    else:
+      common = np.intersect1d(common, neighborhood_set(text, k, d), assume_unique=True)
+    if len(common) == 0:
+      break
+  return common if common is not None else np.zeros(0, dtype=np.uint64)
+
+## TESTS
+def test_mismatch_masks():
+  assert neighborhood_size(4, 3) == 1 + 4*3 + 6*9 + 4*27
+  assert neighborhood_size(3, 5) == 4**3
+  masks = mismatch_masks(5, 2)
+  assert len(np.unique(masks)) == len(masks)
+  with pytest.raises(ValueError):
+    mismatch_masks(33, 1)
+
+def test_neighbors():
+  assert neighbors('AAT', 1) == {'GAT', 'TAT', 'CAT', 'AAA', 'AAT', 'ATT', 'AAC', 'AAG', 'ACT', 'AGT'}
+  assert neighbors('ACGT', 0) == {'ACGT'}
+  assert neighbors('A', 1) == {'A', 'C', 'G', 'T'}
+  code = encode_kmer('GATTACA')
+  assert neighbor_codes(code, 7, 2) is neighbor_codes(code, 7, 2)
+  batch = neighbor_codes_batch(np.array([code, encode_kmer('TTTTTTT')]), 7, 2)
+  assert batch.shape == (2, neighborhood_size(7, 2))
+  assert batch[0].tolist() == neighbor_codes(code, 7, 2).tolist()
+
+def test_mismatch_counts():
+  text = 'ACGTTGCATGTCGCATGATGCATGAGAGCT'
+  words, count = most_frequent_with_mismatches(text, 4, 1)
+  assert sorted(words) == ['ATGC', 'ATGT', 'GATG'] and count == 5
+  assert sorted(most_frequent_with_mismatches(text, 4, 1, reverse_complements=True)[0]) == ['ACAT', 'ATGT']
+  assert most_frequent_with_mismatches('AGGCGG', 3, 0)[0] == ['AGG', 'CGG', 'GCG', 'GGC']
+  #the reverse-complement table equals counting the reverse complement strand separately
+  rc = 'AGCTCTCATGCATCATGCGACATGCAACGT'
+  assert (mismatch_counts(text, 5, 2, True) == mismatch_counts(text, 5, 2) + mismatch_counts(rc, 5, 2)).all()
+  assert most_frequent_with_mismatches('AC', 3, 1) == ([], 0)
+
+def test_motif_enumeration_codes():
+  texts = ['ATTTGGC', 'TGCCTTA', 'CGGTATC', 'GAAAATT']
+  assert decode_kmers(motif_enumeration_codes(texts, 3, 1), 3) == ['ATA', 'ATT', 'GTT', 'TTT']
+  assert decode_kmers(neighborhood_set('ACGT', 4, 0), 4) == ['ACGT']
+  assert len(neighborhood_set('ACGTACGT', 3, 3)) == 64
+  #past the dense limit the sets are intersected directly
+  texts = ['ACGTTGCATGTCGCATGATGCATGAGAGCT', 'GCATGATGCATGAGAGCTACGTTGCATGTC']
+  assert decode_kmers(motif_enumeration_codes(texts, 13, 1), 13) == sorted(
+    set(decode_kmers(neighborhood_set(texts[0], 13, 1), 13)) & set(decode_kmers(neighborhood_set(texts[1], 13, 1), 13)))
+  assert motif_enumeration_codes(['AAAA', 'CCCC'], 4, 1).tolist() == []
+  #filtering by distance once few motifs remain agrees with intersecting neighborhoods
+  texts = ['TTCAGACCATTAATACAGGGCGCCA', 'GTTGAACTGACAACATGTTCGACTA', 'GACCGTGCCGCAAAAGGGGGTCCTG', 'ATTCCTAATAAGCCTCAAGAGCGAA']
+  common = neighborhood_set(texts[0], 5, 2)
+  for text in texts[1:]:
+    assert (common[within_distance(common, text, 5, 2)] == np.intersect1d(common, neighborhood_set(text, 5, 2))).all()
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
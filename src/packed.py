@@ -0,0 +1,178 @@
+"""2-bit packed DNA sequences.
+
+Bases are coded in the order of constants.BASES (A=0, C=1, G=2, T=3), so the
+complement of a code c is 3-c and integer order matches lexicographic order.
+"""
+import sys
+from typing import Iterator
+
+import numpy as np
+import pytest
+
+import constants
+
+_ENCODE = np.full(256, 255, dtype=np.uint8)
+for _code, _base in enumerate(constants.BASES):
+  _ENCODE[ord(_base)] = _code
+  _ENCODE[ord(_base.lower())] = _code
+_DECODE = np.frombuffer(''.join(constants.BASES).encode('ascii'), dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8) #first base in the high bits of each byte
+
+def encode(text: str) -> np.ndarray:
+  """Encodes a DNA string as a uint8 array with one base code per element"""
+  raw = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+  codes = _ENCODE[raw]
+  if codes.size and codes.max() == 255:
+    bad = text[int(np.argmax(codes == 255))]
+    raise ValueError(f"invalid base {bad!r}, expected one of {constants.BASES}")
+  return codes
+
+def decode(codes: np.ndarray) -> str:
+  """Decodes an array of base codes back into a DNA string"""
+  return _DECODE[codes].tobytes().decode('ascii')
+
+def pack(codes: np.ndarray) -> np.ndarray:
+  """Packs base codes 4 to a byte"""
+  n = len(codes)
+  padded = np.zeros(-(-n // 4) * 4, dtype=np.uint8)
+  padded[:n] = codes
+  quads = padded.reshape(-1, 4)
+  return (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+
+def unpack(data: np.ndarray, start: int, length: int) -> np.ndarray:
+  """Unpacks `length` base codes starting at base `start` of a packed buffer"""
+  first, last = start // 4, -(-(start + length) // 4)
+  codes = ((data[first:last, None] >> _SHIFTS) & 3).ravel()
+  offset = start - first * 4
+  return codes[offset:offset + length]
+
+class PackedGenome:
+  """A DNA sequence stored at 2 bits per base.
+  Slices and windows are views over the same buffer, so taking a k-mer never copies the genome.
+  """
+  __slots__ = ('data', 'start', 'length')
+
+  def __init__(self, data: np.ndarray, length: int, start: int = 0):
+    self.data = data
+    self.start = start
+    self.length = length
+
+  @classmethod
+  def from_str(cls, text: str) -> 'PackedGenome':
+    return cls.from_codes(encode(text))
+
+  @classmethod
+  def from_codes(cls, codes: np.ndarray) -> 'PackedGenome':
+    return cls(pack(codes), len(codes))
+
+  @property
+  def nbytes(self) -> int:
+    return self.data.nbytes
+
+  def codes(self) -> np.ndarray:
+    """The bases of this sequence as a uint8 array of codes (one byte per base)"""
+    return unpack(self.data, self.start, self.length)
+
+  def window(self, i: int, k: int) -> 'PackedGenome':
+    """Zero-copy view of the k bases starting at i"""
+    return self[i:i+k]
+
+  def windows(self, k: int) -> Iterator['PackedGenome']:
+    for i in range(self.length - k + 1):
+      yield PackedGenome(self.data, k, self.start + i)
+
+  def reverse_complement(self) -> 'PackedGenome':
+    return PackedGenome.from_codes(3 - self.codes()[::-1])
+
+  def __len__(self) -> int:
+    return self.length
+
+  def __getitem__(self, key):
+    if isinstance(key, slice):
+      start, stop, step = key.indices(self.length)
+      if step == 1:
+        return PackedGenome(self.data, max(stop - start, 0), self.start + start)
+      return PackedGenome.from_codes(self.codes()[key])
+    if key < 0:
+      key += self.length
+    if not 0 <= key < self.length:
+      raise IndexError("PackedGenome index out of range")
+    return decode(unpack(self.data, self.start + key, 1))
+
+  def __str__(self) -> str:
+    return decode(self.codes())
+
+  def __repr__(self) -> str:
+    preview = str(self[:20]) + ('..' if self.length > 20 else '')
+    return f"PackedGenome('{preview}', length={self.length})"
+
+  def __eq__(self, other) -> bool:
+    if isinstance(other, str):
+      return self.length == len(other) and str(self) == other
+    if isinstance(other, PackedGenome):
+      return self.length == other.length and np.array_equal(self.codes(), other.codes())
+    return NotImplemented
+
+  def __hash__(self) -> int:
+    return hash(str(self)) #hash like the equal str so packed and plain k-mers share dict keys
+
+def as_codes(text: 'str|PackedGenome|np.ndarray') -> np.ndarray:
+  """Base codes for any supported sequence type. Whitespace in strings is dropped, so raw file reads
+  (with line breaks and a trailing newline) encode as the sequence they hold."""
+  if isinstance(text, PackedGenome):
+    return text.codes()
+  if isinstance(text, np.ndarray):
+    return text
+  return encode(''.join(text.split()))
+
+def as_str(text: 'str|PackedGenome') -> str:
+  return text if isinstance(text, str) else str(text)
+
+def find_exact(codes: np.ndarray, pattern: np.ndarray) -> list[int]:
+  """All start positions of pattern in codes.
+  Candidates are narrowed one pattern position at a time, so the work is dominated by the first base.
+  """
+  m = len(pattern)
+  if m == 0 or m > len(codes):
+    return []
+  cands = np.arange(len(codes) - m + 1)
+  for j in range(m):
+    cands = cands[codes[cands + j] == pattern[j]]
+  return cands.tolist()
+
+## TESTS
+def test_encode_decode():
+  assert encode('ACGT').tolist() == [0, 1, 2, 3]
+  assert encode('acgt').tolist() == [0, 1, 2, 3]
+  assert decode(encode('GATTACA')) == 'GATTACA'
+  with pytest.raises(ValueError):
+    encode('ACNT')
+  assert as_codes('AC\nGT\n').tolist() == [0, 1, 2, 3]
+
+def test_packed_genome():
+  text = 'GATATATGCATATACTTA'
+  genome = PackedGenome.from_str(text)
+  assert len(genome) == len(text)
+  assert genome.nbytes == 5
+  assert str(genome) == text
+  assert genome == text
+  assert genome[3] == text[3] and genome[-1] == text[-1]
+  for i in range(len(text)):
+    for j in range(i, len(text) + 1):
+      assert str(genome[i:j]) == text[i:j]
+  window = genome.window(5, 7)
+  assert window.data is genome.data
+  assert window == text[5:12]
+  assert [str(w) for w in genome.windows(4)] == [text[i:i+4] for i in range(len(text)-3)]
+  assert str(genome.reverse_complement()) == 'TAAGTATATGCATATATC'
+  assert str(genome[2:9].reverse_complement()) == 'GCATATA'
+  assert str(genome[::-1]) == text[::-1]
+  assert {genome[1:5]: 1}.get(text[1:5]) == 1
+
+def test_find_exact():
+  assert find_exact(encode('GATATATGCATATACTT'), encode('ATAT')) == [1, 3, 9]
+  assert find_exact(encode('GCGCG'), encode('GCG')) == [0, 2]
+  assert find_exact(encode('ACG'), encode('ACGT')) == []
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
@@ -0,0 +1,95 @@
+"""Independent motif search restarts spread over a process pool.
+
+Each worker draws from its own random.Random seeded from a numpy SeedSequence spawned off the
+caller's seed, so a run is reproducible for a fixed seed and worker count.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import motifs as motifs_engine
+from packed import as_codes
+
+def worker_rngs(seed: int, workers: int) -> list[random.Random]:
+  return [random.Random(int(child.generate_state(1, dtype=np.uint64)[0])) for child in np.random.SeedSequence(seed).spawn(workers)]
+
+def split_work(total: int, workers: int) -> list[int]:
+  """total units of work split as evenly as possible, earlier workers taking the remainder"""
+  return [total // workers + (i < total % workers) for i in range(workers)]
+
+def _randomized_worker(codes, k, pseudo_counts, batch_size, objective, restarts, rng):
+  start = time.perf_counter()
+  best_motifs, best_score = motifs_engine.randomized_search(codes, k, restarts, pseudo_counts, rng, batch_size, objective)
+  return best_motifs, best_score, restarts, time.perf_counter() - start
+
+def _gibbs_worker(codes, k, iters, pseudo_counts, objective, chains, rng):
+  start = time.perf_counter()
+  best_motifs, best_score = None, float('inf')
+  for _ in range(chains):
+    motifs, score = motifs_engine.gibbs_sample(codes, k, iters, pseudo_counts, rng, objective)
+    if score < best_score:
+      best_motifs, best_score = motifs, score
+  return best_motifs, best_score, chains, time.perf_counter() - start
+
+def _run(worker, args: tuple, work: int, workers: int|None, seed: int):
+  """Runs worker(*args, share, rng) for each worker's share of work, returning the best (motifs, score)
+  over all workers (the lowest worker id on ties) and per-worker stats"""
+  workers = max(1, min(workers or os.cpu_count() or 1, work))
+  shares = split_work(work, workers)
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    futures = [pool.submit(worker, *args, share, rng) for share, rng in zip(shares, worker_rngs(seed, workers))]
+    results = [f.result() for f in futures]
+  best_motifs, best_score = None, float('inf')
+  stats = []
+  for i, (motifs, score, units, seconds) in enumerate(results):
+    if score < best_score:
+      best_motifs, best_score = motifs, score
+    stats.append({'worker': i, 'units': units, 'seconds': seconds, 'units_per_second': units / seconds if seconds else float('inf'), 'score': score})
+  return best_motifs, best_score, stats
+
+def randomized_motif_search(codes: list[np.ndarray], k: int, restarts: int, workers: int|None = None, seed: int = 0, pseudo_counts=True, batch_size=1, objective='counts') -> tuple[np.ndarray, int|float, list[dict]]:
+  """Randomized motif search with restarts split over workers (all cpus when None), each running batch_size restarts at a time.
+  Returns the best motif matrix, its score and per-worker stats where units are restarts."""
+  return _run(_randomized_worker, (codes, k, pseudo_counts, batch_size, objective), restarts, workers, seed)
+
+def gibbs_motif_search(codes: list[np.ndarray], k: int, iters: int, chains: int, workers: int|None = None, seed: int = 0, pseudo_counts=True, objective='counts') -> tuple[np.ndarray, int|float, list[dict]]:
+  """Independent Gibbs chains of iters steps each split over workers; units in the stats are chains."""
+  return _run(_gibbs_worker, (codes, k, iters, pseudo_counts, objective), chains, workers, seed)
+
+## TESTS
+TEXTS = ['CGCCCCTCTCGGGGGTGTTCAGTAAACGGCCA', 'GGGCGAGGTATGTGTAAGTGCCAAGGTGCCAG',
+         'TAGTACCGAGACCGAAAGAAGTATACAGGCGT', 'TAGATCAAGTTTCAGGTGCACGTCGGTGAACC',
+         'AATCCACCAGCTCCACGTGCAATGTTGGCCTA']
+
+def test_split_work():
+  assert split_work(10, 3) == [4, 3, 3]
+  assert split_work(2, 2) == [1, 1]
+  assert worker_rngs(7, 2)[1].random() == worker_rngs(7, 2)[1].random()
+  assert worker_rngs(7, 2)[0].random() != worker_rngs(7, 2)[1].random()
+
+def test_parallel_randomized_motif_search():
+  codes = [as_codes(text) for text in TEXTS]
+  motifs, score, stats = randomized_motif_search(codes, 8, 40, workers=2, seed=3)
+  assert score == motifs_engine.score_counts(motifs_engine.count_matrix(motifs))
+  assert [s['units'] for s in stats] == [20, 20]
+  assert score == min(s['score'] for s in stats)
+  #the same seed and worker count gives the same answer, and matches running the workers' streams serially
+  again, again_score, _ = randomized_motif_search(codes, 8, 40, workers=2, seed=3)
+  assert again_score == score and (again == motifs).all()
+  serial = [motifs_engine.randomized_search(codes, 8, 20, True, rng)[1] for rng in worker_rngs(3, 2)]
+  assert min(serial) == score
+
+def test_parallel_gibbs_motif_search():
+  codes = [as_codes(text) for text in TEXTS]
+  motifs, score, stats = gibbs_motif_search(codes, 8, 200, chains=3, workers=2, seed=5)
+  assert [s['units'] for s in stats] == [2, 1]
+  assert score == motifs_engine.score_counts(motifs_engine.count_matrix(motifs))
+  assert gibbs_motif_search(codes, 8, 200, chains=3, workers=2, seed=5)[1] == score
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
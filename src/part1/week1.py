@@ -3,6 +3,8 @@ from lib import *
 from util import *
 import logging
 import constants
+import fmindex
+from matching import MultiPatternMatcher
 import os
 
 def test_week1():
@@ -42,12 +44,20 @@ def test_week1():
   #1.3-6
   print_sep("""Return a space-separated list of starting positions (in increasing order) where CTTGATCAT appears as a substring in the Vibrio cholerae genome""")
   with open(constants.DATASETS['cholera']) as f: vibrio_cholera_genome = f.read()
-  ans = pattern_match(vibrio_cholera_genome, 'CTTGATCAT')
+  matches = MultiPatternMatcher(['CTTGATCAT', reverse_complement('CTTGATCAT')]).find_all(vibrio_cholera_genome)
+  ans = matches['CTTGATCAT']
   print(' '.join([str(x) for x in ans]))
   assert(ans == [60039,98409,129189,152283,152354,152411,163207,197028,200160,357976,376771,392723,532935,600085,622755,1065555])
   print_sep("""Positions for the reverse complement:""")
-  ans = pattern_match(vibrio_cholera_genome, reverse_complement('CTTGATCAT'))
+  ans = matches[reverse_complement('CTTGATCAT')]
   print(' '.join([str(x) for x in ans]))
+  print_sep("""The same queries through the genome's FM-index, built once and saved next to the input""")
+  index = fmindex.load_or_build('cholera')
+  patterns = ['CTTGATCAT', reverse_complement('CTTGATCAT')]
+  assert [pattern_match(index, p) for p in patterns] == [matches[p] for p in patterns]
+  print(f"index stats: {index.stats}")
+  print(f"exact query latency: {fmindex.query_latency(index, patterns) * 1e6:.0f}us, "
+        f"d=1: {fmindex.query_latency(index, patterns, d=1) * 1e6:.0f}us")
 
   #1.4-5
   print_sep("""Clump Finding Problem: Find patterns forming clumps in a string.
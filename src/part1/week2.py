@@ -4,11 +4,12 @@ import math
 from lib import *
 from util import *
 import constants
+import skew
 
 def test_week2():
   #1.7-8
   print_sep("""Give all the values of Skew_i(GAGCCACCGCGATA) for i ranging from 0 to 14 as a collection of space-separated integers""")
-  skews = [str(s) for s in gc_skew_iter("GAGCCACCGCGATA")]
+  skews = [str(s) for s in skew.skew_array("GAGCCACCGCGATA")]
   ans = ' '.join(skews)
   print(ans)
   
@@ -76,7 +77,7 @@ def test_week2():
   print_sep("Epilogue: Find a DnaA Box in Salmonella enterica!!")
   print("The skew diagram shows the minimum at around position 3,923,600")
   salmonella: str = constants.dataset('salmonella')
-  ori_cands = minimum_skew(salmonella)
+  ori_cands = skew.min_skew_positions(salmonella)
   print(f"Minimum skew positions computed: {ori_cands}")
   ori_cand = ori_cands[0]
 
@@ -106,9 +107,7 @@ def test_week2():
   print(f"Hamming distance = {hamming_distance(s,t)}")
 
   s = 'GATACACTTCCCGAGTAGGTACTG'
-  skews = enumerate(list(gc_skew_iter(s)))
-  min_skew = min(skews, key=lambda t: t[1])
-  min_skew_index = min_skew[0]+1
+  min_skew_index = int(np.argmin(skew.skew_array(s)))+1
   print(f"Min skew at position {min_skew_index}")
 
   soln = pattern_count_approx("CATGCCATTCGCATTGTCCCAGTGA", "CCC", d=2)
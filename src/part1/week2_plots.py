@@ -4,7 +4,7 @@ import pandas as pd
 import numpy as np
 
 import constants
-from lib import gc_skew_iter
+import skew
 
 def get_counts_ecoli(nucleotide):
   if nucleotide not in ['A', 'T', 'G', 'C']:
@@ -123,12 +123,8 @@ def graph_diff_counts_pct(b1,b2):
   return (fig, descr)
 
 def graph_skew_diagram(genome_dataset, sample_freq=100):
-  skewg = gc_skew_iter(constants.dataset(genome_dataset))
   # Dont plot every point, sample uniformly
-  skew_pts = []
-  for i, val in enumerate(skewg):
-    if i%sample_freq == 0:
-      skew_pts.append(val)
+  skew_pts = skew.skew_array(constants.dataset(genome_dataset))[::sample_freq]
 
   fig = go.Figure()
   fig.add_trace(go.Scatter(
@@ -1,6 +1,4 @@
 from collections import defaultdict
-import json
-import os
 import sys
 import pytest
 import math
@@ -8,6 +6,7 @@ import random
 
 from lib import *
 from util import *
+import cache
 import constants
 
 import cProfile
@@ -18,7 +17,7 @@ def test_week4():
   input=(['GAAATGGACCTTTGTAAGCTCCCTTCAAAGTGGTTCAATTTTAAGCCCACGAAACCCCTCCCTTATGTCTAGATAACGTCAACGCCTGGAAACGCAACGCGTTCGCACACAGCCGTGCCCTGGCGCTTGGATCGGCCCCTTATGAGAGATGGAAGAAATGGACCTTTGT','AAGCTCCCTTCAAAGTGGTTCAATTTTAAGCCCACGAAGTCCCATATTTTTGCACCCCTCCCTTATGTCTAGATAACGTCAACGCCTGGAAACGCAACGCGTTCGCACACAGCCGTGCCCTGGCGCTTGGATCGGCCCCTTATGAGAGATGGAAGAAATGGACCTTTGT','ACTGTTGCATGTATTTTTGACAGGGTATTGAGTGGTTAGCAAGGATCCTCGAAAACGCCCACTCTCCAAGGGAATAATCAAGCAATCAGTTGCACATCAGTACAGTCGATAGGTTGTATTCCCTCGTAGAGATTGTGGTAAGTCGCGAGTGATAAGTTATGCTTTCAAC','CAAGGGCGTGGTCTTGTTCAGGTATCACGTATTGACGGATGGAATGTGTACTTACTGCTGCTCGGAAGCTTTCGGCGATAAAGAACGTTGATTCCAGGCGCTCTCGTCGAGTCATGTATCACTGCTGCAAATACGTGGTCCACTATGTCTTTGCAATTCGACGGACTAA','CGAGCTGGATGCCCATAATCGGTCATGTATTCCCGCTGCACGCCGGTGGAGCTTATCCGAACACGGACTCTGCGCCGGGCGTCCCATCAGCATAGAAACTCTCATCATGTAATGACGCGCGAACCTTATCGGTTCGCGTCTAACATGGTGCTGCCTTGCTGTTGTACTG','AAATGATGGTCAGTCACCATGCATGGACCTCATGTATTTTTATAGGCGGACTCAGACTATCCTACGAAAGTGAGGGCCCGGTACGCAGACAGAACGCGCGAGGCGACCGCGTCCCGCGATGGAAAGGGGATGCCGCCGGCCAACTTTCAGTCTGCTGAGTCTACGATTG','ACCCCTGCTCGCGTTTTCCTTTACAGCCGAGTGGTCAGTACGCCTACACCAGTCCCGTTCGGTATCCAGCAAGCCAACCATTTGGAGGGCTGTGGGCAAACGTCATGATATTTTGCCGGACAATTCACCTACGTAAGATAAACAATGGCCGGGTACTCTCCGCTTTCGG','TTCTACAGGAGGTTCACGAAGGGCCGCAGAATTACCTCCAAGCTCATCAAGACGGGGCGAAAACCGTGGACTTTATAATGGAGGAGACATACACCCGTGGCCAACAGAAGCTATACGGGTCCCACTTGATCGCGTTGACTCGGGGGTCATGTTGATTTGCCCCCATCTC','TAAAAATTAGGCTCAAGCATGTAGGACTGAAAGCATTTCCAGCATTCGTTCCTCTCACTCCCTCCACGAGGGGGGATCGCGATCTAGTACCTTCACCACCAAGGGGACTGGTCATGTATTTGCCCGGTCGCTATCCCCTAGGCCCATGCCGGACATTTACAAGCCAACG','TTATTCCACGTGATTTGAGTTCTAACCACCCGCGCCTTCGTATCGCCACGAGGGTTGTATTTTTGCCAGATGATCCCTTAACCGTGGGCAAAATAGAACCCTGAGGATAGACACGGGTTTGGGCGCCTCCCAGAGGTGCTACTCACGCGAGGTTTAACAAGCATCAGTA','TGAAACTTACCAAAGTTCGCCTTGCCTGTCCCGGCCCGCAGCCCTCTGGATCTGGACGGGAGAAAGGCAGTTGCGGGTGACACAAGCTGGAAAAGAACGGTAGTACAAGTTTTAGGGTAGCGGTGCTACGGATCACCCACTAAATATGTATTTTTGCAGGCGACTAGAC','CTAGGGATCGTCCAGTCCAAAAAATGATCGCCGATGGTCAACCATTTTTGCCATCTGATAGAGAGTTTCATCTTATGCAGCTAATCACTACCGCGCTGTTCTTGGGGCCTGAACCGCCTACGTGGGTGGACCTGATTATTCTGCCCGGCTCAACTATCGTTGCTCCAAT','TCCGATGAACGGCAAGGGAGGTGCCAAGACATACGGTTAGACGCTCCCTATGTCATGTATTTTCATATCAGGCGGAGGTCCGTGTCTACCAGCTCGGGTCACCTAGGGGGATAGCGTTGTATAGGATCGCTTGTGTGGTCGCACTGAAGCGGAAAAATTAGGGGCCGTC','ACCGATATACACCCCTGCCTCCTTGTCGTCTTGGTCAGTGAATTGTGCGCCGCGTGTGGCACCTAGTTAACACGAAGCAACTAACTATCGCCGATGTTTGCCCCCAATCGCTTCTAGCTACCCACGTCATGTAAGCTTGCCGTTATGTCCCCGTCAGGCCCGGGTAGTA','AAACATCAAACAGTAAAATATAGTTTCCGTTATAGTCTACCCGGTAGTAGCGTATTTTTGCGATACAGAAGTCCGAGAGCAAGGATTAGTTATGCGTGGGAAAGCACCTGGTGCTTTATCCCTTACACTGCGACGATTTAAGGCCTCTGTGTATATACTCGACTTACAA','AGCTAGTCCCTTATTTTTGCCGATCGAAATAGTGGCATTTGTTGGTTCGAGGGAACGTATGACCGATTGTTGAGTGACCCGATTTATGGGCCGTACCAACTTGCGCGCATACTCCATACTCTACACACACGTTTTACCGAGAGAACTTGAAGCCAATGCGACCTAAACA','CCAAGAGGCTATTAGCGGCACAGGGTGCGTGCCTCGTGATTTCGGAGTGCTTTAGTCCCAAAAAGGAAGCGGCTGAGGTGACTGCGCTTCCTAAGTTTCAACGCGGTGGGTGCGCGCGAAGTCACTAATTTTTGCCGTGGCGGTCTAATAGACAAGCTGGGGTGTGTCG','GGCCGTCGTACATTTGATCTCGGCGGGCCCTCACAGCAGGGTCCTCTGCGTGCACCCCGCATATGAGGACCCCCTAAATTTGTACATGAGTGAGGGTCATAGCTTTTTGCTTACCCCACAACGTAAGTATGATTGATGAGATTCTAGTGCGGGGCTAGTTAATTGTACA','CGCACCAGCCTTGTTCGCTCATCCCGTCATGACATTTTGCTTGTTTGAACCCCTTTTACAGATCAGATACGGCTTAATTTACGACACACAGGCAGTAGATACGCTGGTGGGTGTACAATAAAAAGCACCTTGTACTCAGCCATCGCCGGGCCGCACGATGAAGGTGGCG','ACGCCAAGTGGCTGTGTGGCCGCACGAAGTTTTCATGGACCGAAGCCCAACTACGTCATCAGTTTTTGCAGTGTGCAGCCTTTCGTCCCACGGATCGGTGGTCTAAAGTCGACCTATGCGAGGACGCTTGGTAACATTCGAGCTCTTACCCCTTATAGTCATATGTCCG'],
          15)
   print(f"k={input[1]}-motif search on {input[0]}")
-  #soln = randomized_motif_search(*input, iterations=50, debug=False) #takes about 1.5s/10 iters, run 1000 for best soln
+  #soln = randomized_motif_search(*input, iterations=1000, workers=os.cpu_count()) #restarts spread over all cores
   #print(soln)
   #print_iter(soln[0])
 
@@ -49,59 +48,25 @@ def test_week4():
   #print(gsoln)
   #print_iter(gsoln[0])
 
-  def cache_results(results):
-    with open('../outputs/dosr_results.json','w') as f:
-      return f.write(json.dumps(results))
-  
   print_sep("Find the binding sites of the DosR (Dormancy Survival Regulator) transcription factor in TB")
   dosr = constants.dataset('tb_dosr')
   print(dosr)
 
-  dosr_results = {}
-  rewrite = False
-  if rewrite or not os.path.exists('../outputs/dosr_results.json'):
-    cache_results(dosr_results)
-  elif os.path.exists('../outputs/dosr_results.json'):
-     print("reading")
-     with open('../outputs/dosr_results.json','r') as f:
-        dosr_results = json.loads(f.read())
-
-  print(dosr_results)
-  
-  regen = False
+  #results are cached under outputs/cache keyed by parameters, data, seed and code (lib and every project
+  #module it imports), so reruns are instant and any change recomputes. Call .uncached to force a fresh run.
+  gibbs_search = cache.cached('gibbs')(gibbs_sampling_motif_search)
+  random_search = cache.cached('randomized')(randomized_motif_search)
+  median_search = cache.cached('median_strings')(median_strings)
   for k in range(8,13):
     print_sep(f"k={k}")
 
-    iters = 4000
-    if not regen and str(k) in dosr_results.get('gibbs',[]):
-      result = dosr_results['gibbs'][str(k)][0]
-      gibbs = (result['kmers'], result['score'])
-    else:
-      gibbs = gibbs_sampling_motif_search(texts=dosr,k=k,iters=iters)
-      dosr_results['gibbs'] = {}
-      dosr_results['gibbs'].setdefault(str(k), []).append({'kmers': gibbs[0], 'score': gibbs[1]})
-      cache_results(dosr_results)
+    gibbs = gibbs_search(texts=dosr, k=k, iters=4000, seed=k)
     print(f"\tGibbs soln: {gibbs}")
 
-    iters = 2000
-    if not regen and str(k) in dosr_results.get('random',[]):
-      result = dosr_results['random'][str(k)][0]
-      randomr = (result['kmers'], result['score'])
-    else:
-      randomr = randomized_motif_search(texts=dosr,k=k,iterations=iters)
-      dosr_results['random'] = {}
-      dosr_results['random'].setdefault(str(k), []).append({'kmers': randomr[0], 'score': randomr[1]})
-      cache_results(dosr_results)
+    randomr = random_search(texts=dosr, k=k, iterations=2000, seed=k, batch_size=200)
     print(f"\tRandom soln: {randomr}")
-    
-    if not regen and str(k) in dosr_results.get('median',[]):
-      result = dosr_results['median'][str(k)][0]
-      median = (result['kmers'], result['score'])
-    else:
-      median = median_strings(texts=dosr, k=k)
-      dosr_results['median'] = {}
-      dosr_results['median'].setdefault(str(k), []).append({'kmers': median[0], 'score': None})
-      cache_results(dosr_results)
+
+    median = median_search(texts=dosr, k=k)
     print(f"\tMedian soln: {median}")
 
   print_sep("Quiz")
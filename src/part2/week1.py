@@ -1,13 +1,22 @@
 from collections import defaultdict
 import sys
-from typing import List, Sequence
+from typing import Iterable, List, Sequence
+import numpy as np
 import pytest
 
 from lib import *
 from util import *
+import assembly
 import constants
-
-def string_composition(s: str, k: int):
+from kmers import MAX_K, decode_kmers
+from packed import PackedGenome
+import seqio
+
+def string_composition(s: 'str|Iterable[seqio.SequenceBatch]', k: int):
+  """k-mers of a string, or of every fragment of a sequence file's batches (see seqio.py)"""
+  if not isinstance(s, (str, PackedGenome, np.ndarray)):
+    kcodes = list(seqio.composition(s, k))
+    return decode_kmers(np.concatenate(kcodes), k) if kcodes else []
   return [s[i:i+k] for i in range(len(s)-k+1)]
 
 def kmer_path_to_string(path: Sequence[str]) -> str:
@@ -18,7 +27,12 @@ def kmer_path_to_string(path: Sequence[str]) -> str:
   print(''.join(s[0:10]))
   return ''.join(s)
 
-def overlap_graph(reads: Sequence[str]):
+def overlap_graph(reads: Sequence[str], backend='numpy', csr=False):
+  """The numpy backend indexes reads by prefix code (see assembly.overlap_graph) and returns the
+  assembly.CSRGraph itself when csr is set. Repeated reads are a single node."""
+  if backend == 'numpy':
+    graph = assembly.overlap_graph(reads)
+    return graph if csr else graph.to_dict()
   n = len(reads[0])
   nodes = defaultdict(list)
   for read in reads:
@@ -28,7 +42,13 @@ def overlap_graph(reads: Sequence[str]):
         nodes[read].append(read2)
   return nodes
 
-def de_bruijn_graph_from_string(s: str, k: int):
+def de_bruijn_graph_from_string(s: 'str|Iterable[seqio.SequenceBatch]', k: int, backend='numpy'):
+  """The numpy backend builds a CSR graph over integer (k-1)-mer codes (see assembly.py) and exports it.
+  Sequence batches (see seqio.py) are consumed as code arrays, without k-mer strings."""
+  if not isinstance(s, (str, PackedGenome, np.ndarray)):
+    return assembly.de_bruijn_from_batches(s, k).to_dict()
+  if backend == 'numpy' and k <= MAX_K:
+    return assembly.de_bruijn_from_string(s, k).to_dict()
   kmers = string_composition(s, k)
   nodes = defaultdict(list)
   for kmer in kmers:
@@ -37,7 +57,10 @@ def de_bruijn_graph_from_string(s: str, k: int):
     nodes[prefix].append(suffix)
   return nodes
 
-def de_bruijn_graph_from_kmers(kmers: Sequence[str], k: int|None = None):
+def de_bruijn_graph_from_kmers(kmers: Sequence[str], k: int|None = None, backend='numpy'):
+  """The numpy backend needs k <= MAX_K for integer codes, longer k-mers use the python backend"""
+  if backend == 'numpy' and (k or len(kmers[0])) <= MAX_K:
+    return assembly.de_bruijn_from_kmers(kmers, k).to_dict()
   if not k:
     k = len(kmers[0])
   nodes = defaultdict(list)
@@ -99,6 +122,7 @@ def test_string_composition():
   input = ('CAATCCAAC',5)
   output = string_composition(*input)
   assert sorted(output) == sorted(["CAATC","AATCC","ATCCA","TCCAA","CCAAC"])
+  assert string_composition([seqio.SequenceBatch.from_strings(['CAATCCAAC', 'ccaNAATCC'])], 5) == output + ['AATCC']
   print(c("GREEN","PASSED"))
 
 def test_kmer_path_to_string():
@@ -112,16 +136,26 @@ def test_overlap_graph():
   input = (['ATGCG','GCATG','CATGC','AGGCA','GGCAT','GGCAC'],)
   output = overlap_graph(['ATGCG','GCATG','CATGC','AGGCA','GGCAT','GGCAC'])
   assert output == {'GCATG': ['CATGC'], 'CATGC': ['ATGCG'], 'AGGCA': ['GGCAT', 'GGCAC'], 'GGCAT': ['GCATG']}
+  assert overlap_graph(*input, backend='python') == output
+  assert overlap_graph(*input, csr=True).num_edges == 5
+  reads = ['ATGCG'*8, 'TGCGA'*8, 'GCGAT'*8, 'ATGCG'*8, 'CCCCC'*8]
+  assert overlap_graph(reads) == overlap_graph(list(dict.fromkeys(reads)), backend='python')
 
 def test_de_bruijn_graph():
   input = ("AAGATTCTCTAAGA", 4)
   output = de_bruijn_graph_from_string(*input)
   assert output == {'AAG': ['AGA', 'AGA'], 'AGA': ['GAT'], 'GAT': ['ATT'], 'ATT': ['TTC'], 'TTC': ['TCT'], 'TCT': ['CTC', 'CTA'], 'CTC': ['TCT'], 'CTA': ['TAA'], 'TAA': ['AAG']}
+  assert de_bruijn_graph_from_string(*input, backend='python') == output
+  assert de_bruijn_graph_from_string([seqio.SequenceBatch.from_strings(['AAGATTCTCTAAGA'])], 4) == output
 
 def test_de_bruijn_graph_from_kmers():
   input = (['GAGG','CAGG','GGGG','GGGA','CAGG','AGGG','GGAG'], 4)
   output = de_bruijn_graph_from_kmers(*input)
   assert output == {'GAG': ['AGG'], 'CAG': ['AGG', 'AGG'], 'GGG': ['GGG', 'GGA'], 'AGG': ['GGG'], 'GGA': ['GAG']}
+  assert de_bruijn_graph_from_kmers(*input, backend='python') == output
+  #past MAX_K the numpy backend falls back to python instead of overflowing its codes
+  assert de_bruijn_graph_from_kmers(['A'*33, 'C'+'A'*32]) == {'A'*32: ['A'*32], 'C'+'A'*31: ['A'*32]}
+  assert de_bruijn_graph_from_string('C' + 'A'*34, 33) == {'C'+'A'*31: ['A'*32], 'A'*32: ['A'*32, 'A'*32]}
 
 if __name__ == '__main__':
   init_db()
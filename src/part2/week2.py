@@ -1,70 +1,40 @@
 from collections import defaultdict
-import copy
 import sys
-from typing import Iterable, List
+from typing import Iterable, List, Sequence
 import pytest
 import random
 
 from lib import *
 from util import *
+import assembly
 import constants
 
 def eulerian_cycle(graph, start=None):
-  my_graph = copy.deepcopy(graph)
-  def visit(node):
-      while my_graph[node]:
-          next_node = my_graph[node].pop()
-          visit(next_node)
-      cycle.append(node)
-
-  cycle = []
-  start_node = start if start else 0
-  visit(start_node)
-  return list(reversed(cycle))
+  """Eulerian cycle of an adjacency dict from start (node 0 by default), found on CSR arrays (see assembly.py)"""
+  csr = assembly.CSRGraph.from_dict(graph)
+  labels = csr.labels()
+  start = start if start else 0
+  start_id = labels.index(start) if start in graph else None
+  return [labels[u] for u in assembly.eulerian_cycle(csr, start_id).tolist()]
 
 def eulerian_path(graph):
-  my_graph = copy.deepcopy(graph)
-  path = []
-  def visit(node):
-      while my_graph[node]:
-          next_node = my_graph[node].pop()
-          visit(next_node)
-      path.append(node)
+  """Eulerian path of an adjacency dict, from the node with one more outgoing than incoming edge"""
+  csr = assembly.CSRGraph.from_dict(graph)
+  labels = csr.labels()
+  return [labels[u] for u in assembly.eulerian_path(csr).tolist()]
 
-  start_node = next(node for node, edges in graph.items() if edges)
-  visit(start_node)
-  path = list(reversed(path))
-  if any(edges for edges in graph.values()):
-      # If not, find a new starting node and repeat the process
-      for node in path:
-        if graph[node]:
-          new_path = eulerian_path({node: graph[node] for node in path[path.index(node):]})
-          path = path[:path.index(node)] + new_path + path[path.index(node) + len(new_path):]
-          break
-  return path
+def maximal_non_branching_paths(graph):
+  """Maximal non-branching paths of an adjacency dict, as lists of its nodes (see assembly.unitigs)"""
+  csr = assembly.CSRGraph.from_dict(graph)
+  labels = csr.labels()
+  offsets, nodes = assembly.unitigs(csr)
+  return [[labels[u] for u in nodes[lo:hi]] for lo, hi in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
 
+def contigs(kmers: Sequence[str]) -> list[str]:
+  """Contigs of a k-mer collection: the spelled maximal non-branching paths of its De Bruijn graph"""
+  graph = assembly.de_bruijn_from_kmers(kmers)
+  return assembly.spell_unitigs(graph, *assembly.unitigs(graph))
 
-  incomings = {}
-  for (k,vs) in graph.items():
-      for v in vs:
-         incomings[v] = incomings.get(v,[]) + [k]
-      if not k in incomings:
-         incomings[k] = []
-  start, end = None, None
-  print(incomings)
-  for k,v in incomings.items():
-    if len(v) == len(graph[k]) + 1:
-      end = k
-    if len(v) == len(graph[k]) - 1:
-      start = k
-    
-  print(dotviz_graph(graph))
-  assert start != None, "no start node for eulerian path"
-  assert end != None, "no end node for eulerian path"
-  new_graph = copy.deepcopy(graph)
-  new_graph[end] = graph[end] + [start]
-  return eulerian_cycle(new_graph, start=start)[:-1]
-  
 def test_week2():
   print()
   print_sep("Bioinformatics II: Week 1 - How do we assemble genomes? (Part 2/2)")
@@ -96,6 +66,11 @@ def test_week2():
 
 
 
+def test_contigs():
+  paths = maximal_non_branching_paths({1: [2], 2: [3], 3: [4, 5], 6: [7], 7: [6]})
+  assert paths == [[1, 2, 3], [3, 4], [3, 5], [6, 7, 6]]
+  assert sorted(contigs(['ATG', 'ATG', 'TGT', 'TGG', 'CAT', 'GGA', 'GAT', 'AGA'])) == ['AGA', 'ATG', 'ATG', 'CAT', 'GAT', 'TGGA', 'TGT']
+
 def rotation_eq(l1:list, l2:list):
   """Tests if two lists are rotations of each other"""
   start_indexes = [i for i, x in enumerate(l2) if x == l1[0]]
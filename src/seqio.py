@@ -0,0 +1,244 @@
+"""Streaming FASTA/FASTQ reading into batches of base codes.
+
+Files are read in large line-aligned chunks (buffered reads or an mmap) and each chunk is parsed with
+array operations. Bases are case-insensitive and line breaks inside a sequence are dropped. Any other
+non-ACGT character (N, IUPAC codes, gaps) ends a fragment: a batch holds the ACGT runs of its records
+CSR-style, so k-mer windows never span a skipped run. A file with no headers is one unnamed record.
+"""
+import mmap
+import os
+import sys
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+import pytest
+
+import constants
+from kmers import DENSE_LIMIT, count_kmer_codes, kmer_codes
+from packed import decode
+
+CHUNK_SIZE = 1 << 24 #bytes parsed at once
+_OTHER, _SPACE = 4, 5
+_CODES = np.full(256, _OTHER, dtype=np.uint8) #non-ACGT bytes end a fragment, whitespace is dropped
+for _code, _base in enumerate(constants.BASES):
+  _CODES[ord(_base)] = _code
+  _CODES[ord(_base.lower())] = _code
+for _byte in b' \t\r\n':
+  _CODES[_byte] = _SPACE
+
+class SequenceBatch:
+  """ACGT fragments of some records: fragment i is codes[offsets[i]:offsets[i+1]], from record names[records[i]]"""
+  def __init__(self, codes: np.ndarray, offsets: np.ndarray, records: np.ndarray, names: list[str]):
+    self.codes = codes
+    self.offsets = offsets
+    self.records = records
+    self.names = names
+
+  @classmethod
+  def from_strings(cls, seqs: Sequence[str], names: Sequence[str]|None = None) -> 'SequenceBatch':
+    """A batch of in-memory sequences (such as a read set from strings.db), split at non-ACGT characters"""
+    raw = np.frombuffer(''.join(seqs).encode('ascii'), dtype=np.uint8)
+    record = np.repeat(np.arange(len(seqs)), [len(s) for s in seqs])
+    return _batch(_CODES[raw], record, list(names) if names is not None else [str(i) for i in range(len(seqs))])
+
+  @property
+  def num_fragments(self) -> int:
+    return len(self.offsets) - 1
+
+  def strings(self) -> list[str]:
+    text = decode(self.codes)
+    return [text[lo:hi] for lo, hi in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())]
+
+  def kmer_codes(self, k: int) -> np.ndarray:
+    """Codes of the k-mer windows of every fragment, in order"""
+    kcodes = kmer_codes(self.codes, k)
+    fragment_ends = np.repeat(self.offsets[1:], np.diff(self.offsets))[:len(kcodes)]
+    return kcodes[np.arange(len(kcodes)) + k <= fragment_ends]
+
+def _batch(codes: np.ndarray, record: np.ndarray, names: list[str]) -> SequenceBatch:
+  """Batch of a code stream (with _SPACE and _OTHER bytes) whose elements belong to the given record numbers.
+  Only records with some ACGT base are kept."""
+  keep = codes != _SPACE
+  codes, record = codes[keep], record[keep]
+  valid = codes < _OTHER
+  starts = valid.copy()
+  starts[1:] &= ~valid[:-1] | (record[1:] != record[:-1])
+  lengths = np.bincount(np.cumsum(starts)[valid] - 1, minlength=int(starts.sum()))
+  offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+  np.cumsum(lengths, out=offsets[1:])
+  used, records = np.unique(record[starts], return_inverse=True)
+  return SequenceBatch(codes[valid], offsets, records.ravel().astype(np.int64), [names[r] for r in used.tolist()])
+
+def _line_chunks(path: str, chunk_size: int, use_mmap: bool) -> Iterator[bytes]:
+  """Pieces of the file of about chunk_size bytes, each ending at a line break (or the end of the file).
+  A line longer than chunk_size is kept whole."""
+  with open(path, 'rb') as f:
+    if not use_mmap:
+      leftover = b''
+      while piece := f.read(chunk_size):
+        piece = leftover + piece
+        end = piece.rfind(b'\n') + 1
+        leftover = piece[end:]
+        if end:
+          yield piece[:end]
+      if leftover:
+        yield leftover
+      return
+    if os.fstat(f.fileno()).st_size == 0:
+      return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      start = 0
+      while start < len(mm):
+        end = mm.rfind(b'\n', start, start + chunk_size) + 1
+        if end <= start:
+          end = mm.find(b'\n', start + chunk_size) + 1 or len(mm)
+        yield mm[start:end]
+        start = end
+
+def read_batches(path: str, chunk_size: int = CHUNK_SIZE, overlap: int|None = None, use_mmap=False) -> Iterator[SequenceBatch]:
+  """One batch per chunk of a FASTA, FASTQ (4 lines per record) or plain sequence file.
+  A fragment still open at the end of a chunk is held back and completed from the next chunk, so every
+  fragment is whole. With an overlap, it is emitted and only its last overlap bases are carried over
+  instead, which bounds memory on long records: overlap=k-1 keeps every k-mer window exactly once."""
+  fastq = None
+  name, phase = '', 0 #the record continuing into the next chunk, and FASTQ lines of it already read
+  pending = np.zeros(0, dtype=np.uint8)
+  for chunk in _line_chunks(path, chunk_size, use_mmap):
+    if not chunk.endswith(b'\n'):
+      chunk += b'\n'
+    if fastq is None:
+      if not chunk.strip():
+        continue
+      fastq = chunk.lstrip()[:1] == b'@'
+    arr = np.frombuffer(chunk, dtype=np.uint8)
+    newline = arr == ord('\n')
+    line = np.cumsum(newline) - newline
+    line_ends = np.flatnonzero(newline)
+    line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+    if fastq:
+      #record 0 is the one continuing from the last chunk, record i its (i-1)-th header here
+      kind = (np.arange(len(line_starts)) + phase) % 4
+      record_of_line = (np.arange(len(line_starts)) + phase) // 4 + (phase == 0)
+      headers, is_seq = np.flatnonzero(kind == 0), kind == 1
+      phase = (phase + len(line_starts)) % 4
+    else:
+      is_header = arr[line_starts] == ord('>')
+      record_of_line = np.cumsum(is_header)
+      headers, is_seq = np.flatnonzero(is_header), ~is_header
+    names = [name] + [chunk[line_starts[i]+1:line_ends[i]].decode('ascii').strip() for i in headers.tolist()]
+    name = names[-1]
+    mask = is_seq[line] & ~newline
+    codes, record = _CODES[arr[mask]], record_of_line[line[mask]]
+    if overlap is not None and len(pending):
+      #an emitted fragment's tail is only carried into an actual continuation
+      seq = np.flatnonzero(codes != _SPACE)
+      if not len(seq) or codes[seq[0]] >= _OTHER or record[seq[0]] != 0:
+        pending = pending[:0]
+    codes = np.concatenate([pending, codes])
+    record = np.concatenate([np.zeros(len(pending), dtype=np.int64), record])
+    pending = np.zeros(0, dtype=np.uint8)
+    seq = np.flatnonzero(codes != _SPACE)
+    batch = _batch(codes, record, names)
+    if not fastq and len(seq) and codes[seq[-1]] < _OTHER and record[seq[-1]] == len(names) - 1:
+      #the last fragment may continue in the next chunk
+      last = batch.codes[batch.offsets[-2]:]
+      if overlap is None:
+        pending = last
+        batch = SequenceBatch(batch.codes[:batch.offsets[-2]], batch.offsets[:-1], batch.records[:-1], batch.names)
+      elif overlap:
+        pending = last[-overlap:]
+    if batch.num_fragments:
+      yield batch
+  if overlap is None and len(pending):
+    yield SequenceBatch(pending, np.array([0, len(pending)], dtype=np.int64), np.zeros(1, dtype=np.int64), [name])
+
+def kmer_batches(source: 'str|Iterable[SequenceBatch]', k: int, **kwargs) -> Iterable[SequenceBatch]:
+  """Batches of a file path, read with a k-1 base overlap, or the given batches"""
+  if isinstance(source, (str, os.PathLike)):
+    return read_batches(source, overlap=k-1, **kwargs)
+  return source
+
+def composition(source: 'str|Iterable[SequenceBatch]', k: int) -> Iterator[np.ndarray]:
+  """The k-mer codes of every fragment, one array per batch"""
+  for batch in kmer_batches(source, k):
+    yield batch.kmer_codes(k)
+
+def count_kmers(source: 'str|Iterable[SequenceBatch]', k: int) -> tuple[np.ndarray, np.ndarray]:
+  """Distinct k-mer codes (sorted) and their counts over all batches, merged batch by batch"""
+  if 4**k <= DENSE_LIMIT:
+    table = np.zeros(4**k, dtype=np.int64)
+    for kcodes in composition(source, k):
+      table += np.bincount(kcodes.astype(np.intp), minlength=4**k)
+    present = np.flatnonzero(table)
+    return present.astype(np.uint64), table[present]
+  codes, counts = np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+  for kcodes in composition(source, k):
+    batch_codes, batch_counts = count_kmer_codes(kcodes, k)
+    codes, counts = np.concatenate([codes, batch_codes]), np.concatenate([counts, batch_counts])
+    order = np.argsort(codes, kind='stable')
+    codes, counts = codes[order], counts[order]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    codes, counts = codes[starts], np.add.reduceat(counts, starts) if len(starts) else counts
+  return codes, counts
+
+## TESTS
+FASTA = """>seq1 first record
+ACGTnnACgt
+TTGCA
+>seq2
+NNNN
+>seq3
+ggattacaNCC
+ATTA
+"""
+FASTQ = """@read1
+ACGTNacgt
++
+IIIIIIIII
+@read2
+@@GATT
++
+@@@@@@
+"""
+
+def fragments(batches):
+  return [(batch.names[r], s) for batch in batches for r, s in zip(batch.records.tolist(), batch.strings())]
+
+def test_read_batches(tmp_path):
+  path = tmp_path / 'seqs.fa'
+  path.write_text(FASTA)
+  expected = [('seq1 first record', 'ACGT'), ('seq1 first record', 'ACGTTTGCA'), ('seq3', 'GGATTACA'), ('seq3', 'CCATTA')]
+  for chunk_size in [1, 7, 20, CHUNK_SIZE]:
+    for use_mmap in [False, True]:
+      assert fragments(read_batches(str(path), chunk_size, use_mmap=use_mmap)) == expected
+  #with an overlap, split fragments repeat their last bases
+  assert fragments(read_batches(str(path), 30, overlap=2)) == [
+    ('seq1 first record', 'ACGT'), ('seq1 first record', 'ACGT'), ('seq1 first record', 'GTTTGCA'), ('seq3', 'GGATTACA'), ('seq3', 'CCATTA')]
+  assert fragments(read_batches(str(path), 20, overlap=2)) == expected #the record ends with the chunk, so nothing is carried
+  path = tmp_path / 'reads.fq'
+  path.write_text(FASTQ)
+  for chunk_size in [1, 13, CHUNK_SIZE]:
+    assert fragments(read_batches(str(path), chunk_size)) == [('read1', 'ACGT'), ('read1', 'ACGT'), ('read2', 'GATT')]
+  path = tmp_path / 'genome.txt'
+  path.write_text('ACGT\nacgt')
+  assert fragments(read_batches(str(path))) == [('', 'ACGTACGT')]
+  path.write_text('')
+  assert list(read_batches(str(path), use_mmap=True)) == []
+
+def test_count_kmers(tmp_path):
+  rng = np.random.default_rng(0)
+  genome = decode(rng.integers(0, 4, 20_000).astype(np.uint8))
+  path = tmp_path / 'genome.fa'
+  path.write_text('>genome\n' + '\n'.join(genome[i:i+60] for i in range(0, len(genome), 60)) + '\n')
+  for k in [5, 15]:
+    expected = count_kmer_codes(kmer_codes(genome, k), k)
+    codes, counts = count_kmers(str(path), k) #chunks split the record, the overlap keeps every window once
+    assert (codes == expected[0]).all() and (counts == expected[1]).all()
+    codes, counts = count_kmers(read_batches(str(path), 1000, overlap=k-1), k)
+    assert (codes == expected[0]).all() and (counts == expected[1]).all()
+  batch = SequenceBatch.from_strings(['ACGTA', 'CGNTA', 'GT'])
+  assert batch.strings() == ['ACGTA', 'CG', 'TA', 'GT'] and batch.records.tolist() == [0, 1, 1, 2]
+  assert batch.kmer_codes(2).tolist() == kmer_codes('ACGTA', 2).tolist() + kmer_codes('CGTAGT', 2)[[0, 2, 4]].tolist()
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints
@@ -0,0 +1,90 @@
+"""GC skew (#G - #C) computed with cumulative sums over byte/code arrays."""
+import sys
+from typing import Iterable, Iterator
+
+import numpy as np
+import pytest
+
+from packed import PackedGenome
+
+_BYTE_STEPS = np.zeros(256, dtype=np.int8) #contribution to skew of each ascii byte
+_BYTE_STEPS[[ord('G'), ord('g')]] = 1
+_BYTE_STEPS[[ord('C'), ord('c')]] = -1
+_CODE_STEPS = np.array([0, -1, 1, 0], dtype=np.int8) #A,C,G,T codes
+
+def skew_steps(text: 'str|PackedGenome|np.ndarray') -> np.ndarray:
+  """The skew contribution (+1 for G, -1 for C, 0 otherwise) of each base"""
+  if isinstance(text, PackedGenome):
+    return _CODE_STEPS[text.codes()]
+  if isinstance(text, np.ndarray):
+    return _CODE_STEPS[text]
+  return _BYTE_STEPS[np.frombuffer(text.encode('ascii'), dtype=np.uint8)]
+
+def skew_array(text: 'str|PackedGenome|np.ndarray') -> np.ndarray:
+  """Skew_i(text) for i from 0 to len(text)"""
+  steps = skew_steps(text)
+  skews = np.zeros(len(steps) + 1, dtype=np.int64)
+  np.cumsum(steps, dtype=np.int64, out=skews[1:])
+  return skews
+
+def min_skew_positions(text: 'str|PackedGenome|np.ndarray') -> list[int]:
+  """All positions i >= 1 where the skew attains its minimum"""
+  skews = skew_array(text)[1:]
+  if len(skews) == 0:
+    return []
+  return (np.flatnonzero(skews == skews.min()) + 1).tolist()
+
+def max_skew_positions(text: 'str|PackedGenome|np.ndarray') -> list[int]:
+  """All positions i >= 1 where the skew attains its maximum"""
+  skews = skew_array(text)[1:]
+  if len(skews) == 0:
+    return []
+  return (np.flatnonzero(skews == skews.max()) + 1).tolist()
+
+def skew_chunks(chunks: Iterable[str]) -> Iterator[np.ndarray]:
+  """Yields the skew after each base of each chunk, carrying the running skew across chunks,
+  so a genome can be processed without holding it in memory."""
+  offset = 0
+  for chunk in chunks:
+    skews = offset + np.cumsum(skew_steps(chunk), dtype=np.int64)
+    if len(skews):
+      offset = int(skews[-1])
+    yield skews
+
+def extreme_skew_positions_chunked(chunks: Iterable[str]) -> tuple[list[int], list[int]]:
+  """Chunked version of (min_skew_positions, max_skew_positions)"""
+  min_skew, max_skew = None, None
+  min_positions, max_positions = [], []
+  start = 1
+  for skews in skew_chunks(chunks):
+    if len(skews) == 0:
+      continue
+    lo, hi = skews.min(), skews.max()
+    if min_skew is None or lo < min_skew:
+      min_skew, min_positions = lo, []
+    if lo == min_skew:
+      min_positions.extend((np.flatnonzero(skews == lo) + start).tolist())
+    if max_skew is None or hi > max_skew:
+      max_skew, max_positions = hi, []
+    if hi == max_skew:
+      max_positions.extend((np.flatnonzero(skews == hi) + start).tolist())
+    start += len(skews)
+  return min_positions, max_positions
+
+## TESTS
+def test_skew_array():
+  assert skew_array('GAGCCACCGCGATA').tolist() == [0,1,1,2,1,0,0,-1,-2,-1,-2,-1,-1,-1,-1]
+  assert skew_array(PackedGenome.from_str('GAGCCACCGCGATA')).tolist() == skew_array('GAGCCACCGCGATA').tolist()
+  assert skew_array('').tolist() == [0]
+
+def test_extreme_skew_positions():
+  text = 'TAAAGACTGCCGAGAGGCCAACACGAGTGCTAGAACGAGGGGCGTAAACGCGGGTCCGAT'
+  assert min_skew_positions(text) == [11, 24]
+  assert max_skew_positions('GGCCGG') == [2, 6]
+  for size in [1, 5, 7, 100]:
+    chunks = [text[i:i+size] for i in range(0, len(text), size)]
+    assert extreme_skew_positions_chunked(chunks) == (min_skew_positions(text), max_skew_positions(text))
+    assert np.concatenate(list(skew_chunks(chunks))).tolist() == skew_array(text)[1:].tolist()
+
+if __name__ == '__main__':
+  sys.exit(pytest.main(["-s", __file__])) #-s to not suppress prints